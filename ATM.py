@@ -1,4 +1,17 @@
+import hashlib
+import hmac
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from enum import Enum
+from functools import lru_cache
 
 class TransactionType(Enum):
     WITHDRAWAL = 1
@@ -9,33 +22,170 @@ class TransactionType(Enum):
         for transaction_type in TransactionType:
             print(transaction_type)
 
+def _pin_digest(pin, salt, iterations):
+    # module level so that it can be shipped to a process pool
+    return hashlib.pbkdf2_hmac("sha256", str(pin).encode(), salt, iterations)
+
+def _is_pin_digest_correct(pin, salt, digest, iterations):
+    return hmac.compare_digest(_pin_digest(pin, salt, iterations), digest)
+
+class PinVerifier:
+    '''
+    Checks PINs against salted PBKDF2 hashes and locks a card out after
+    max_attempts failures. Failure counters live in a bounded LRU and expire
+    after lockout_time, so cards that stop failing drop out on their own.
+
+    Every guess reserves an attempt under the lock before the slow key
+    derivation and settles it when the result is recorded, so concurrent
+    guesses on one card, e.g. from several ATMs, can never exceed
+    max_attempts between them.
+    '''
+    def __init__(self, iterations=100000, max_attempts=3, lockout_time=15 * 60, max_tracked_cards=100000):
+        self.iterations = iterations
+        self.max_attempts = max_attempts
+        self.lockout_time = lockout_time
+        self.max_tracked_cards = max_tracked_cards
+        self.__failures = OrderedDict()  # card number -> [failed attempts, expiry]
+        self.__in_flight = {}  # card number -> guesses reserved but not recorded yet
+        self.__lock = threading.Lock()
+        self.__pool = None
+
+    def hash_pin(self, pin):
+        salt = os.urandom(16)
+        return salt, _pin_digest(pin, salt, self.iterations)
+
+    def is_locked(self, card_number):
+        with self.__lock:
+            failures = self.__failures.get(card_number)
+            if failures is None:
+                return False
+            if failures[1] <= time.monotonic():
+                del self.__failures[card_number]
+                return False
+            return failures[0] >= self.max_attempts
+
+    def __reserve(self, card_number):
+        with self.__lock:
+            failures = self.__failures.get(card_number)
+            failed = failures[0] if failures is not None and failures[1] > time.monotonic() else 0
+            in_flight = self.__in_flight.get(card_number, 0)
+            if failed + in_flight >= self.max_attempts:
+                return False
+            self.__in_flight[card_number] = in_flight + 1
+            return True
+
+    def __record(self, card_number, is_correct):
+        with self.__lock:
+            in_flight = self.__in_flight.pop(card_number, 0) - 1
+            if in_flight > 0:
+                self.__in_flight[card_number] = in_flight
+            if is_correct:
+                self.__failures.pop(card_number, None)
+                return
+            now = time.monotonic()
+            failures = self.__failures.get(card_number)
+            if failures is None or failures[1] <= now:
+                failures = [0, 0]
+            failures[0] += 1
+            failures[1] = now + self.lockout_time
+            self.__failures[card_number] = failures
+            self.__failures.move_to_end(card_number)
+            if len(self.__failures) > self.max_tracked_cards:
+                self.__failures.popitem(last=False)
+
+    def verify(self, card_number, pin, pin_hash):
+        if not self.__reserve(card_number):
+            return False
+        salt, digest = pin_hash
+        is_correct = _is_pin_digest_correct(pin, salt, digest, self.iterations)
+        self.__record(card_number, is_correct)
+        return is_correct
+
+    def verify_batch(self, requests, max_workers=None):
+        '''
+        Verifies (card number, pin, pin hash) requests on a process pool, the
+        key derivation is CPU bound and would otherwise run one at a time.
+
+        Guesses reserve attempts like verify does, in rounds: a round submits
+        as many guesses of each card as it has attempts left, and the next
+        round goes on after those are recorded. Guesses of a card with no
+        attempts left fail without being derived.
+        '''
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers=max_workers)
+        results = [False] * len(requests)
+        by_card = OrderedDict()
+        for index, (card_number, pin, pin_hash) in enumerate(requests):
+            by_card.setdefault(card_number, deque()).append((index, pin, pin_hash))
+        while by_card:
+            pending = []
+            for card_number, queued in list(by_card.items()):
+                reserved = 0
+                while queued and self.__reserve(card_number):
+                    index, pin, (salt, digest) = queued.popleft()
+                    pending.append((index, card_number, self.__pool.submit(_is_pin_digest_correct, pin, salt, digest, self.iterations)))
+                    reserved += 1
+                if not queued or reserved == 0:
+                    del by_card[card_number]
+            for index, card_number, future in pending:
+                results[index] = future.result()
+                self.__record(card_number, results[index])
+        return results
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+DEFAULT_PIN_VERIFIER = PinVerifier()
+
 class Card:
-    def __init__(self, card_number, pin, account):
+    def __init__(self, card_number, pin, account, pin_verifier=DEFAULT_PIN_VERIFIER):
         self.__card_number = card_number
-        self.__pin = pin
+        self.__pin_verifier = pin_verifier
+        self.__pin_hash = pin_verifier.hash_pin(pin)
         self.__account = account
+
+    def get_card_number(self):
+        return self.__card_number
     
     def is_pin_correct(self, pin):
-        return self.__pin == pin
+        return self.__pin_verifier.verify(self.__card_number, pin, self.__pin_hash)
+
+    def is_locked(self):
+        return self.__pin_verifier.is_locked(self.__card_number)
 
     def get_bank_balance(self):
         return self.__account.get_balance()
 
     def withdraw(self, amount):
         return self.__account.withdraw(amount)
+
+    def get_account(self):
+        return self.__account
     
 class BankAccount:
-    def __init__(self, balance):
+    def __init__(self, balance, account_id=None):
+        self.__account_id = account_id
         self.__balance = balance
+        self.__lock = threading.Lock()  # one lock per account, so ATMs only contend on the same account
     
+    def get_account_id(self):
+        return self.__account_id
+
     def get_balance(self):
         return self.__balance
     
     def withdraw(self, amount):
-        if amount > self.__balance:
-            return "Insufficient balance"
-        self.__balance -= amount
-        return "Withdrawal successful"
+        with self.__lock:
+            if amount > self.__balance:
+                return "Insufficient balance"
+            self.__balance -= amount
+            return "Withdrawal successful"
+
+    def deposit(self, amount):
+        with self.__lock:
+            self.__balance += amount
 
 class User:
     def __init__(self, name, card, account):
@@ -52,195 +202,475 @@ class User:
     def get_account(self):
         return self.__account
 
+class TransactionStatus(Enum):
+    SUCCESS = 1
+    INVALID_OPERATION = 2
+    INVALID_PIN = 3
+    INSUFFICIENT_ATM_BALANCE = 4
+    INSUFFICIENT_ACCOUNT_BALANCE = 5
+    UNABLE_TO_DISPENSE = 6
+    CARD_LOCKED = 7
+    LEDGER_UNAVAILABLE = 8
+
+class Transaction:
+    def __init__(self, card, pin, transaction_type, amount=0):
+        self.card = card
+        self.pin = pin
+        self.transaction_type = transaction_type
+        self.amount = amount
+
+class TransactionResult:
+    def __init__(self, transaction, status, notes=None, balance=None):
+        self.transaction = transaction
+        self.status = status
+        self.notes = notes
+        self.balance = balance
+
+class EventType(Enum):
+    STATE_TRANSITION = 1
+    CARD_INSERTED = 2
+    PIN_AUTHENTICATED = 3
+    INVALID_PIN = 4
+    SELECT_OPERATION = 5
+    ILLEGAL_OPERATION = 6
+    INVALID_OPERATION = 7
+    ENTER_AMOUNT = 8
+    BALANCE = 9
+    INSUFFICIENT_ATM_BALANCE = 10
+    INSUFFICIENT_ACCOUNT_BALANCE = 11
+    UNABLE_TO_DISPENSE = 12
+    NOTES_DISPENSED = 13
+    CARD_RETURNED = 14
+    EXIT = 15
+    TRANSACTION_COMPLETED = 16
+    ATM_STATE = 17
+    CARD_LOCKED = 18
+    LEDGER_UNAVAILABLE = 19
+
+class EventSink(ABC):
+    @abstractmethod
+    def emit(self, event_type, **fields):
+        pass
+
+    def close(self):
+        pass
+
+class NullEventSink(EventSink):
+    def emit(self, event_type, **fields):
+        pass
+
+class ConsoleEventSink(EventSink):
+    '''
+    Human readable output for interactive sessions. Events without a message,
+    such as state transitions, are not shown.
+    '''
+    DENOMINATION_NAMES = {100: "Hundreds", 20: "Twenties", 5: "Fives", 1: "Ones"}
+
+    def __init__(self):
+        self.messages = {
+            EventType.CARD_INSERTED: "Card inserted",
+            EventType.PIN_AUTHENTICATED: "Pin authenticated",
+            EventType.INVALID_PIN: "Invalid pin",
+            EventType.CARD_LOCKED: "Card locked, too many invalid pin attempts",
+            EventType.SELECT_OPERATION: "\n".join(["Select operation"] + [str(transaction_type) for transaction_type in TransactionType]),
+            EventType.ILLEGAL_OPERATION: "OOPs! Invalid operation",
+            EventType.INVALID_OPERATION: "Invalid operation",
+            EventType.ENTER_AMOUNT: "Enter amount to withdraw",
+            EventType.BALANCE: "Balance:  {balance}",
+            EventType.INSUFFICIENT_ATM_BALANCE: "Insufficient balance in the ATM",
+            EventType.INSUFFICIENT_ACCOUNT_BALANCE: "Insufficient balance in the account",
+            EventType.UNABLE_TO_DISPENSE: "Unable to dispense the requested amount",
+            EventType.LEDGER_UNAVAILABLE: "Unable to record the transaction, please try again later",
+            EventType.CARD_RETURNED: "Card returned",
+            EventType.EXIT: "Exiting",
+            EventType.ATM_STATE: self.format_atm_state,
+        }
+
+    def format_atm_state(self, state, cassettes, balance):
+        lines = ["ATM State", "Curr State:  " + state]
+        for denomination, count in cassettes.items():
+            lines.append(self.DENOMINATION_NAMES.get(denomination, str(denomination) + "s") + ":  " + str(count))
+        lines.append("Balance:  " + str(balance))
+        return "\n".join(lines)
+
+    def emit(self, event_type, **fields):
+        message = self.messages.get(event_type)
+        if message is None:
+            return
+        if callable(message):
+            print(message(**fields))
+        else:
+            print(message.format(**fields))
+
+class FanOutEventSink(EventSink):
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def emit(self, event_type, **fields):
+        for sink in self.sinks:
+            sink.emit(event_type, **fields)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+class RingBufferEventSink(EventSink):
+    '''
+    Keeps the latest records in memory, older ones are overwritten once the
+    buffer is full
+    '''
+    def __init__(self, capacity=65536):
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, event_type, **fields):
+        self.records.append((time.time(), event_type, fields))
+
+    def get_records(self):
+        return list(self.records)
+
+class EventSinkError(Exception):
+    pass
+
+class JsonLinesFileEventSink(EventSink):
+    '''
+    Appends records to a buffer and leaves the encoding and the file writes to
+    a background thread, so emitting an event never waits on the disk. The
+    buffer holds at most capacity records, when the writer falls behind the
+    oldest are dropped and counted in dropped. Once the writer has failed,
+    emit and close raise EventSinkError.
+    '''
+    def __init__(self, path, flush_interval=0.5, capacity=65536):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = deque(maxlen=capacity)
+        self.dropped = 0
+        self.__error = None
+        self.__stopped = threading.Event()
+        self.__writer = threading.Thread(target=self.__run, daemon=True)
+        self.__writer.start()
+
+    def emit(self, event_type, **fields):
+        if self.__error is not None:
+            raise EventSinkError("Event writer failed: " + self.path) from self.__error
+        records = self.records
+        if len(records) == records.maxlen:
+            self.dropped += 1
+        records.append((time.time(), event_type, fields))
+
+    def __flush(self, file):
+        lines = []
+        while self.records:
+            timestamp, event_type, fields = self.records.popleft()
+            lines.append(json.dumps({"ts": timestamp, "event": event_type.name, **fields}, default=str))
+        if lines:
+            file.write("\n".join(lines) + "\n")
+            file.flush()
+
+    def __run(self):
+        try:
+            with open(self.path, "a") as file:
+                while not self.__stopped.wait(self.flush_interval):
+                    self.__flush(file)
+                self.__flush(file)
+        except Exception as error:
+            self.__error = error
+            self.records.clear()
+
+    def close(self):
+        self.__stopped.set()
+        self.__writer.join()
+        if self.__error is not None:
+            raise EventSinkError("Event writer failed: " + self.path) from self.__error
+
 class ATMState:
+    '''
+    States hold no per session data, so a single shared instance of each state
+    (see the flyweights below the state classes) serves every ATM
+    '''
+    def on_enter(self, atm):
+        pass
+
+    def insert_card(self, atm, card):
+        atm.emit(EventType.ILLEGAL_OPERATION)
+        return TransactionStatus.INVALID_OPERATION
     
-    def insert_card(self, card):
-        print("OOPs! Invalid operation")
-    
-    def authenticate_pin(self, card, pin):
-        print("OOPs! Invalid operation")
+    def authenticate_pin(self, atm, card, pin):
+        atm.emit(EventType.ILLEGAL_OPERATION)
+        return TransactionStatus.INVALID_OPERATION
 
-    def select_operation(self, card, transaction_type):
-        print("OOPs! Invalid operation")
+    def select_operation(self, atm, card, transaction_type):
+        atm.emit(EventType.ILLEGAL_OPERATION)
+        return TransactionStatus.INVALID_OPERATION
     
-    def withdraw(self, card, amount):
-        print("OOPs! Invalid operation")
+    def withdraw(self, atm, card, amount):
+        atm.emit(EventType.ILLEGAL_OPERATION)
+        return TransactionStatus.INVALID_OPERATION
     
-    def check_balance(self, card):
-        print("OOPs! Invalid operation")
+    def check_balance(self, atm, card):
+        atm.emit(EventType.ILLEGAL_OPERATION)
+        return TransactionStatus.INVALID_OPERATION
     
-    def return_card(self):
-        print("OOPs! Invalid operation")
+    def return_card(self, atm):
+        atm.emit(EventType.ILLEGAL_OPERATION)
     
-    def exit(atm):
-        print("OOPs! Invalid operation")
+    def exit(self, atm):
+        atm.emit(EventType.ILLEGAL_OPERATION)
 
 class IdleState(ATMState):
     def insert_card(self, atm, card):
-        print("Card inserted")
-        atm.set_curr_atm_state(HasCardState())
+        atm.emit(EventType.CARD_INSERTED)
+        atm.set_curr_atm_state(HAS_CARD_STATE)
+        return TransactionStatus.SUCCESS
 
 class HasCardState(ATMState):
     def authenticate_pin(self, atm, card, pin):
+        if card.is_locked():
+            atm.emit(EventType.CARD_LOCKED)
+            self.exit(atm)
+            return TransactionStatus.CARD_LOCKED
         if card.is_pin_correct(pin):
-            print("Pin authenticated")
-            atm.set_curr_atm_state(SelectOperationState())
+            atm.emit(EventType.PIN_AUTHENTICATED)
+            atm.set_curr_atm_state(SELECT_OPERATION_STATE)
+            return TransactionStatus.SUCCESS
         else:
-            print("Invalid pin")
+            atm.emit(EventType.INVALID_PIN)
             self.exit(atm)
+            return TransactionStatus.INVALID_PIN
     
-    def return_card(self):
-        print("Card returned")
+    def return_card(self, atm):
+        atm.emit(EventType.CARD_RETURNED)
     
     def exit(self, atm):
-        self.return_card()
-        atm.set_curr_atm_state(IdleState())
-        print("Exiting")
+        self.return_card(atm)
+        atm.set_curr_atm_state(IDLE_STATE)
+        atm.emit(EventType.EXIT)
         
 class SelectOperationState(ATMState):
-    def __init__(self):
-        self.show_operations()
-    
-    def show_operations(self):
-        print("Select operation")
-        TransactionType.show_transaction_types()
+    def on_enter(self, atm):
+        atm.emit(EventType.SELECT_OPERATION)
 
 
     def select_operation(self, atm, card, transaction_type):
         if transaction_type == TransactionType.WITHDRAWAL:
-            atm.set_curr_atm_state(WithdrawalState())
+            atm.set_curr_atm_state(WITHDRAWAL_STATE)
         elif transaction_type == TransactionType.BALANCE_CHECK:
-            atm.set_curr_atm_state(CheckBalanceState())
+            atm.set_curr_atm_state(CHECK_BALANCE_STATE)
         else:
-            print("Invalid operation")
+            atm.emit(EventType.INVALID_OPERATION)
             self.exit(atm)
+            return TransactionStatus.INVALID_OPERATION
+        return TransactionStatus.SUCCESS
     
-    def return_card(self):
-        print("Card returned")
+    def return_card(self, atm):
+        atm.emit(EventType.CARD_RETURNED)
     
     def exit(self, atm):
-        self.return_card()
-        atm.set_curr_atm_state(IdleState())
-        print("Exiting")
+        self.return_card(atm)
+        atm.set_curr_atm_state(IDLE_STATE)
+        atm.emit(EventType.EXIT)
 
 class CheckBalanceState(ATMState):
     def check_balance(self, atm, card):
-        print("Balance: ", card.get_bank_balance())
+        atm.emit(EventType.BALANCE, balance=card.get_bank_balance())
         self.exit(atm)
+        return TransactionStatus.SUCCESS
     
-    def return_card(self):
-        print("Card returned")
+    def return_card(self, atm):
+        atm.emit(EventType.CARD_RETURNED)
     
     def exit(self, atm):
-        self.return_card()
-        atm.set_curr_atm_state(IdleState())
-        print("Exiting")
+        self.return_card(atm)
+        atm.set_curr_atm_state(IDLE_STATE)
+        atm.emit(EventType.EXIT)
 
 class WithdrawalState(ATMState):
-    def __init__(self):
-        print("Enter amount to withdraw")
+    def on_enter(self, atm):
+        atm.emit(EventType.ENTER_AMOUNT)
 
     def withdraw(self, atm, card, amount):
         if atm.get_balance() < amount:
-            print("Insufficient balance in the ATM")
+            atm.emit(EventType.INSUFFICIENT_ATM_BALANCE, amount=amount)
             self.exit(atm)
+            return TransactionStatus.INSUFFICIENT_ATM_BALANCE
         elif card.get_bank_balance() < amount:
-            print("Insufficient balance in the account")
+            atm.emit(EventType.INSUFFICIENT_ACCOUNT_BALANCE, amount=amount)
             self.exit(atm)
-        else:
-            card.withdraw(amount)
-            atm.withdraw(amount)
-            
-            # chain of responsibility
-            cash_withdraw_processor = HundredCashWithdrawProcessor(TwentyCashWithdrawProcessor(FiveCashWithdrawProcessor(OneCashWithdrawProcessor(None))))
+            return TransactionStatus.INSUFFICIENT_ACCOUNT_BALANCE
 
-            cash_withdraw_processor.withdraw(atm, amount)
+        # plan the notes before touching the account so that a withdrawal
+        # never gets debited when the cassettes cannot make up the amount
+        notes = atm.plan_withdrawal(amount)
+        if notes is None:
+            atm.emit(EventType.UNABLE_TO_DISPENSE, amount=amount)
             self.exit(atm)
+            return TransactionStatus.UNABLE_TO_DISPENSE
+
+        if not atm.can_record_withdrawal(card):
+            return self.__ledger_unavailable(atm, amount)
+
+        # the balance check above can be stale when another ATM hits the same
+        # account, the debit itself is atomic and has the final say
+        if card.withdraw(amount) != "Withdrawal successful":
+            atm.emit(EventType.INSUFFICIENT_ACCOUNT_BALANCE, amount=amount)
+            self.exit(atm)
+            return TransactionStatus.INSUFFICIENT_ACCOUNT_BALANCE
+
+        try:
+            atm.record_withdrawal(card, amount, notes)
+        except (LedgerError, OSError):
+            # nothing was dispensed, give the money back
+            card.get_account().deposit(amount)
+            return self.__ledger_unavailable(atm, amount)
+        atm.withdraw(amount)
+        atm.dispense(notes)
+        self.exit(atm)
+        return TransactionStatus.SUCCESS
 
-    def return_card(self):
-        print("Card returned")
+    def __ledger_unavailable(self, atm, amount):
+        atm.emit(EventType.LEDGER_UNAVAILABLE, amount=amount)
+        self.exit(atm)
+        return TransactionStatus.LEDGER_UNAVAILABLE
+
+    def return_card(self, atm):
+        atm.emit(EventType.CARD_RETURNED)
     
     def exit(self, atm):
-        self.return_card()
-        atm.set_curr_atm_state(IdleState())
-        print("Exiting")
+        self.return_card(atm)
+        atm.set_curr_atm_state(IDLE_STATE)
+        atm.emit(EventType.EXIT)
+
+# flyweights shared by every ATM
+IDLE_STATE = IdleState()
+HAS_CARD_STATE = HasCardState()
+SELECT_OPERATION_STATE = SelectOperationState()
+CHECK_BALANCE_STATE = CheckBalanceState()
+WITHDRAWAL_STATE = WithdrawalState()
+
+# largest knapsack, in gcd units, an ATM will run for one request
+MAX_PLAN_UNITS = 200000
+
+@lru_cache(maxsize=4096)
+def _plan_notes(denominations, amount, counts):
+    # greedy is optimal for canonical denomination sets and is O(denominations),
+    # so it is tried first
+    notes = []
+    remaining = amount
+    for denomination, count in zip(denominations, counts):
+        required = min(remaining // denomination, count)
+        notes.append(required)
+        remaining -= required * denomination
+    if remaining == 0:
+        return tuple(notes)
+
+    # cheap infeasibility checks first, so a bad amount never reaches the
+    # O(amount * bundles) knapsack below
+    if sum(denomination * count for denomination, count in zip(denominations, counts)) < amount:
+        return None
+    unit = 0
+    for denomination, count in zip(denominations, counts):
+        if count:
+            unit = math.gcd(unit, denomination)
+    if unit == 0 or amount % unit:
+        return None
+    if amount // unit > MAX_PLAN_UNITS:
+        return None
+
+    # greedy got stuck on an empty cassette or a non canonical set,
+    # fall back to a bounded knapsack that minimises the number of notes,
+    # counted in units of the gcd of the usable denominations
+    denominations_in_units = tuple(denomination // unit for denomination in denominations)
+    amount_in_units = amount // unit
+    INF = amount_in_units + 1
+    min_notes = [0] + [INF] * amount_in_units
+    choice = [None] * (amount_in_units + 1)
+    for index, (denomination, count) in enumerate(zip(denominations_in_units, counts)):
+        # binary splitting turns the bounded cassette into 0/1 bundles
+        bundle = 1
+        while count > 0:
+            take = min(bundle, count)
+            count -= take
+            bundle *= 2
+            value = take * denomination
+            for total in range(amount_in_units, value - 1, -1):
+                if min_notes[total - value] + take < min_notes[total]:
+                    min_notes[total] = min_notes[total - value] + take
+                    choice[total] = (index, take, choice[total - value])
+
+    if min_notes[amount_in_units] == INF:
+        return None
+
+    notes = [0] * len(denominations)
+    step = choice[amount_in_units]
+    while step is not None:
+        index, take, step = step
+        notes[index] += take
+    return tuple(notes)
+
+class CashDispenser:
+    '''
+    Decides whether an amount can be dispensed from the current cassettes and
+    with which notes, without touching the cassettes themselves
+    '''
+    def __init__(self, denominations):
+        self.__denominations = tuple(sorted(denominations, reverse=True))
+
+    def get_denominations(self):
+        return self.__denominations
+
+    def plan(self, amount, cassettes):
+        if amount <= 0:
+            return None
+        # notes beyond amount // denomination can never be used, so capping the
+        # counts lets one cached plan serve every inventory in the same bucket
+        counts = tuple(min(cassettes.get(denomination, 0), amount // denomination) for denomination in self.__denominations)
+        notes = _plan_notes(self.__denominations, amount, counts)
+        if notes is None:
+            return None
+        return {denomination: count for denomination, count in zip(self.__denominations, notes) if count}
 
 class CashWithdrawProcessor:
-    def __init__(self, successor):
+    def __init__(self, successor, denomination=None):
         self.__successor = successor
+        self.__denomination = denomination
 
-    def withdraw(self, atm, rem_amount):
+    def withdraw(self, atm, notes):
+        if self.__denomination in notes:
+            atm.withdraw_notes(self.__denomination, notes[self.__denomination])
         if self.__successor is not None:
-            self.__successor.withdraw(atm, rem_amount)
+            self.__successor.withdraw(atm, notes)
+
+    @staticmethod
+    def build_chain(denominations):
+        processor = None
+        for denomination in sorted(denominations):
+            if denomination in CASH_WITHDRAW_PROCESSORS:
+                processor = CASH_WITHDRAW_PROCESSORS[denomination](processor)
+            else:
+                processor = CashWithdrawProcessor(processor, denomination)
+        return processor
 
 class HundredCashWithdrawProcessor(CashWithdrawProcessor):
     def __init__(self, successor):
-        super().__init__(successor)
-    
-    def withdraw(self, atm, rem_amount):
-        print("HundredCashWithdrawProcessor", rem_amount)
-        required = rem_amount // 100
-        remaining = rem_amount % 100
-
-        if required <= atm.get_hundred_count():
-            atm.withdraw_hundred(required)
-        else:
-            atm.withdraw_hundred(atm.get_hundred_count())
-            remaining += (required - atm.get_hundred_count()) * 100
-        
-        if remaining != 0:
-            super().withdraw(atm, remaining)
+        super().__init__(successor, 100)
 
 class TwentyCashWithdrawProcessor(CashWithdrawProcessor):
     def __init__(self, successor):
-        super().__init__(successor)
-    
-    def withdraw(self, atm, rem_amount):
-        required = rem_amount // 20
-        remaining = rem_amount % 20
-
-        if required <= atm.get_twenty_count():
-            atm.withdraw_twenty(required)
-        else:
-            atm.withdraw_twenty(atm.get_twenty_count())
-            remaining += (required - atm.get_twenty_count()) * 20
-        
-        if remaining != 0:
-            super().withdraw(atm, remaining)
+        super().__init__(successor, 20)
 
 class FiveCashWithdrawProcessor(CashWithdrawProcessor):
     def __init__(self, successor):
-        super().__init__(successor)
-    
-    def withdraw(self, atm, rem_amount):
-        required = rem_amount // 5
-        remaining = rem_amount % 5
-
-        if required <= atm.get_five_count():
-            atm.withdraw_five(required)
-        else:
-            atm.withdraw_five(atm.get_five_count())
-            remaining += (required - atm.get_five_count()) * 5
-        
-        if remaining != 0:
-            super().withdraw(atm, remaining)
+        super().__init__(successor, 5)
 
 class OneCashWithdrawProcessor(CashWithdrawProcessor):
     def __init__(self, successor):
-        super().__init__(successor)
-    
-    def withdraw(self, atm, rem_amount):
-        required = rem_amount // 1
-        remaining = rem_amount % 1
+        super().__init__(successor, 1)
 
-        if required <= atm.get_one_count():
-            atm.withdraw_one(required)
-        else:
-            atm.withdraw_one(atm.get_one_count())
-            remaining += (required - atm.get_one_count()) * 1
-        
-        if remaining != 0:
-            super().withdraw(atm, remaining)
+CASH_WITHDRAW_PROCESSORS = {
+    100: HundredCashWithdrawProcessor,
+    20: TwentyCashWithdrawProcessor,
+    5: FiveCashWithdrawProcessor,
+    1: OneCashWithdrawProcessor,
+}
     
 class __ATM(type):
     __instance = None
@@ -251,13 +681,24 @@ class __ATM(type):
         return cls.__instance
 
 class ATM(metaclass=__ATM):
-    def __init__(self):
-        self.__hundred_count = 0
-        self.__twenty_count = 0
-        self.__five_count = 0
-        self.__one_count = 0
-        self.__curr_atm_state = IdleState()
-        self.__balance = 100 * self.__hundred_count + 20 * self.__twenty_count + 5 * self.__five_count + self.__one_count
+    DENOMINATIONS = (100, 20, 5, 1)
+
+    def __init__(self, denominations=DENOMINATIONS, event_sink=None, atm_id=None, ledger=None):
+        self.__atm_id = atm_id
+        self.__ledger = ledger
+        self.__event_sink = event_sink if event_sink is not None else ConsoleEventSink()
+        self.__cassettes = dict.fromkeys(denominations, 0)
+        self.__dispenser = CashDispenser(denominations)
+        self.__cash_withdraw_processor = CashWithdrawProcessor.build_chain(denominations)
+        self.__curr_atm_state = IDLE_STATE
+        self.__last_dispensed = None
+        self.__balance = 0
+
+        if ledger is not None and ledger.get_cassettes(atm_id) is not None:
+            self.__restore_cassettes(ledger.get_cassettes(atm_id))
+
+    def get_atm_id(self):
+        return self.__atm_id
     
     def get_atm_instance(self):
         return self.__instance
@@ -267,55 +708,480 @@ class ATM(metaclass=__ATM):
 
     def set_curr_atm_state(self, curr_atm_state):
         self.__curr_atm_state = curr_atm_state
+        self.__event_sink.emit(EventType.STATE_TRANSITION, state=curr_atm_state.__class__.__name__)
+        curr_atm_state.on_enter(self)
     
     def get_atm_object(self):
         return self.get_atm_instance()
 
     def get_balance(self):
         return self.__balance
+
+    def get_event_sink(self):
+        return self.__event_sink
+
+    def set_event_sink(self, event_sink):
+        self.__event_sink = event_sink
+
+    def emit(self, event_type, **fields):
+        self.__event_sink.emit(event_type, **fields)
+
+    def get_last_dispensed(self):
+        return self.__last_dispensed
     
     def set_atm_balance(self, hundred_count, twenty_count, five_count, one_count):
-        self.__hundred_count = hundred_count
-        self.__twenty_count = twenty_count
-        self.__five_count = five_count
-        self.__one_count = one_count
-        self.__balance = 100 * self.__hundred_count + 20 * self.__twenty_count + 5 * self.__five_count + self.__one_count
+        self.set_cassettes({100: hundred_count, 20: twenty_count, 5: five_count, 1: one_count})
+
+    def set_cassettes(self, cassettes):
+        self.__restore_cassettes(cassettes)
+        if self.__ledger is not None:
+            self.__ledger.log_cassettes(self.__atm_id, self.__cassettes)
+
+    def __restore_cassettes(self, cassettes):
+        for denomination in self.__cassettes:
+            self.__cassettes[denomination] = cassettes.get(denomination, 0)
+        self.__balance = sum(denomination * count for denomination, count in self.__cassettes.items())
+
+    def get_cassettes(self):
+        return dict(self.__cassettes)
+
+    def get_note_count(self, denomination):
+        return self.__cassettes.get(denomination, 0)
     
     def get_hundred_count(self):
-        return self.__hundred_count
+        return self.get_note_count(100)
 
     def get_twenty_count(self):
-        return self.__twenty_count
+        return self.get_note_count(20)
 
     def get_five_count(self):
-        return self.__five_count
+        return self.get_note_count(5)
 
     def get_one_count(self):
-        return self.__one_count
+        return self.get_note_count(1)
+
+    def plan_withdrawal(self, amount):
+        return self.__dispenser.plan(amount, self.__cassettes)
     
+    def can_record_withdrawal(self, card):
+        return self.__ledger is None or self.__ledger.is_tracked(self.__atm_id, card.get_account().get_account_id())
+
+    def record_withdrawal(self, card, amount, notes):
+        # write ahead: the withdrawal is durable before any note leaves the cassettes
+        if self.__ledger is not None:
+            self.__ledger.log_withdrawal(self.__atm_id, card.get_account().get_account_id(), amount, notes)
+
     def withdraw(self, amount):
         self.__balance -= amount
 
+    def dispense(self, notes):
+        # chain of responsibility
+        self.__cash_withdraw_processor.withdraw(self, notes)
+        self.__last_dispensed = notes
+        self.__event_sink.emit(EventType.NOTES_DISPENSED, atm_id=self.__atm_id, notes=notes)
+
+    def withdraw_notes(self, denomination, count):
+        self.__cassettes[denomination] -= count
+
     def withdraw_hundred(self, count):
-        self.__hundred_count -= count
+        self.withdraw_notes(100, count)
     
     def withdraw_twenty(self, count):
-        self.__twenty_count -= count
+        self.withdraw_notes(20, count)
     
     def withdraw_five(self, count):
-        self.__five_count -= count
+        self.withdraw_notes(5, count)
     
     def withdraw_one(self, count):
-        self.__one_count -= count
+        self.withdraw_notes(1, count)
     
+    def process_transaction(self, transaction):
+        start = time.perf_counter()
+        result = self.__process_transaction(transaction)
+        self.__event_sink.emit(EventType.TRANSACTION_COMPLETED, transaction_type=transaction.transaction_type.name, amount=transaction.amount, status=result.status.name, latency=time.perf_counter() - start)
+        return result
+
+    def __process_transaction(self, transaction):
+        card = transaction.card
+        self.__last_dispensed = None
+
+        status = self.__curr_atm_state.insert_card(self, card)
+        if status != TransactionStatus.SUCCESS:
+            return TransactionResult(transaction, status)
+        status = self.__curr_atm_state.authenticate_pin(self, card, transaction.pin)
+        if status != TransactionStatus.SUCCESS:
+            return TransactionResult(transaction, status)
+        status = self.__curr_atm_state.select_operation(self, card, transaction.transaction_type)
+        if status != TransactionStatus.SUCCESS:
+            return TransactionResult(transaction, status)
+
+        if transaction.transaction_type == TransactionType.WITHDRAWAL:
+            status = self.__curr_atm_state.withdraw(self, card, transaction.amount)
+        else:
+            status = self.__curr_atm_state.check_balance(self, card)
+        return TransactionResult(transaction, status, self.__last_dispensed, card.get_bank_balance())
+
+    def process_batch(self, transactions):
+        '''
+        Replays whole card sessions one after another and returns a result per
+        transaction. Pair it with a NullEventSink or a RingBufferEventSink when
+        nobody is watching the console.
+        '''
+        return [self.process_transaction(transaction) for transaction in transactions]
+
     def print_atm_state(self):
-        print("ATM State")
-        print("Curr State: ", self.__curr_atm_state.__class__.__name__)
-        print("Hundreds: ", self.__hundred_count)
-        print("Twenties: ", self.__twenty_count)
-        print("Fives: ", self.__five_count)
-        print("Ones: ", self.__one_count)
-        print("Balance: ", self.__balance)
+        self.__event_sink.emit(EventType.ATM_STATE, state=self.__curr_atm_state.__class__.__name__, cassettes=self.get_cassettes(), balance=self.__balance)
+
+
+class LedgerError(Exception):
+    pass
+
+class Ledger:
+    '''
+    Crash safe record of cassette counts and account balances.
+
+    Every change is appended to a write ahead log and only takes effect once
+    it is durable. Concurrent writers share fsyncs (group commit): whoever
+    finds no flush in progress writes and syncs everything pending, the rest
+    wait for it. If a write or fsync fails the ledger is marked failed and
+    every waiting and later writer gets a LedgerError, since the state of the
+    file is unknown; reopen the ledger to recover from disk. Every
+    snapshot_interval records the ledger state is snapshotted and the log is
+    truncated, so recovery only replays the tail written after the snapshot.
+
+    Lock order is io lock, then lock.
+    '''
+    WAL_FILE = "wal.log"
+    SNAPSHOT_FILE = "snapshot.json"
+
+    def __init__(self, directory, snapshot_interval=10000):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.__wal_path = os.path.join(directory, self.WAL_FILE)
+        self.__snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.__accounts = {}
+        self.__cassettes = {}
+        self.__lsn = 0
+        self.__snapshot_lsn = 0
+        self.__durable_lsn = 0
+        self.__pending = []  # (lsn, record, line) not yet written
+        self.__flushing = False
+        self.__failure = None
+        self.__bank_accounts = {}
+        self.__open_lock = threading.Lock()
+        self.__lock = threading.Lock()
+        self.__io_lock = threading.Lock()
+        self.__flushed = threading.Condition()
+
+        os.makedirs(directory, exist_ok=True)
+        self.__recover()
+        self.__wal = open(self.__wal_path, "a")
+
+    def __recover(self):
+        if os.path.exists(self.__snapshot_path):
+            with open(self.__snapshot_path) as file:
+                snapshot = json.load(file)
+            self.__snapshot_lsn = snapshot["lsn"]
+            self.__accounts = dict(snapshot["accounts"])
+            self.__cassettes = {atm_id: dict(counts) for atm_id, counts in snapshot["cassettes"]}
+        self.__lsn = self.__snapshot_lsn
+
+        if os.path.exists(self.__wal_path):
+            good_offset = 0
+            with open(self.__wal_path, "rb") as file:
+                for line in file:
+                    # every flushed record ends with a newline, a line without
+                    # one was cut off even if it happens to parse
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn write at the tail of the log
+                    if record["lsn"] > self.__snapshot_lsn:
+                        self.__apply(record)
+                        self.__lsn = record["lsn"]
+                    good_offset += len(line)
+            if good_offset < os.path.getsize(self.__wal_path):
+                # drop the torn tail so new records are not glued onto it
+                with open(self.__wal_path, "r+b") as file:
+                    file.truncate(good_offset)
+        self.__durable_lsn = self.__lsn
+        self.__applied_lsn = self.__lsn
+
+    def __apply(self, record):
+        if record["type"] == "account":
+            self.__accounts[record["account"]] = record["balance"]
+        elif record["type"] == "cassettes":
+            self.__cassettes[record["atm"]] = dict(record["counts"])
+        elif record["type"] == "withdrawal":
+            # withdrawals are deltas, so concurrent ATMs on one account may log in any order
+            self.__accounts[record["account"]] -= record["amount"]
+            cassettes = self.__cassettes[record["atm"]]
+            for denomination, count in record["notes"]:
+                cassettes[denomination] -= count
+
+    def __check(self, record):
+        if record["type"] == "withdrawal":
+            if record["account"] not in self.__accounts:
+                raise LedgerError("Account not opened through the ledger: " + str(record["account"]))
+            if record["atm"] not in self.__cassettes:
+                raise LedgerError("ATM cassettes not recorded in the ledger: " + str(record["atm"]))
+
+    def __append(self, record):
+        with self.__lock:
+            if self.__failure is not None:
+                raise LedgerError("Ledger failed, reopen it to recover") from self.__failure
+            # checked before an lsn is taken, so a rejected record leaves no gap
+            self.__check(record)
+            self.__lsn += 1
+            record["lsn"] = self.__lsn
+            self.__pending.append((self.__lsn, record, json.dumps(record)))
+            lsn = self.__lsn
+        self.__sync(lsn)
+        if lsn - self.__snapshot_lsn >= self.snapshot_interval:
+            self.snapshot()
+        return lsn
+
+    def __sync(self, lsn):
+        with self.__flushed:
+            while self.__durable_lsn < lsn and self.__flushing:
+                self.__flushed.wait()
+            if self.__durable_lsn >= lsn:
+                return
+            if self.__failure is not None:
+                raise LedgerError("Ledger write failed") from self.__failure
+            self.__flushing = True
+
+        try:
+            with self.__io_lock:
+                with self.__lock:
+                    pending = self.__pending
+                    self.__pending = []
+                if pending:
+                    offset = self.__wal.tell()
+                    try:
+                        self.__wal.write("\n".join(line for _, _, line in pending) + "\n")
+                        self.__wal.flush()
+                        os.fsync(self.__wal.fileno())
+                    except OSError as error:
+                        self.__fail(error, offset)
+                        raise LedgerError("Ledger write failed") from error
+                    # applied only once durable, so a failed write changes nothing
+                    with self.__lock:
+                        for _, record, _ in pending:
+                            self.__apply(record)
+                        self.__applied_lsn = pending[-1][0]
+                    with self.__flushed:
+                        self.__durable_lsn = max(self.__durable_lsn, pending[-1][0])
+        finally:
+            with self.__flushed:
+                self.__flushing = False
+                self.__flushed.notify_all()
+        if self.__durable_lsn < lsn:
+            raise LedgerError("Ledger write failed") from self.__failure
+
+    def __fail(self, error, offset):
+        with self.__lock:
+            self.__failure = error
+            self.__pending = []
+        try:
+            # best effort, so a restart does not replay records nobody was told succeeded
+            self.__wal.truncate(offset)
+            self.__wal.flush()
+            os.fsync(self.__wal.fileno())
+        except (OSError, ValueError):
+            pass
+
+    def snapshot(self):
+        with self.__io_lock, self.__lock:
+            if self.__failure is not None:
+                raise LedgerError("Ledger failed, reopen it to recover") from self.__failure
+            # pairs rather than objects, json would turn integer ids and denominations into strings
+            # records still pending are not in the state yet, they follow in the log
+            snapshot = {
+                "lsn": self.__applied_lsn,
+                "accounts": list(self.__accounts.items()),
+                "cassettes": [(atm_id, list(counts.items())) for atm_id, counts in self.__cassettes.items()],
+            }
+            temp_path = self.__snapshot_path + ".tmp"
+            with open(temp_path, "w") as file:
+                json.dump(snapshot, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.__snapshot_path)
+
+            # everything written so far is applied and covered by the snapshot
+            self.__wal.seek(0)
+            self.__wal.truncate()
+            self.__wal.flush()
+            os.fsync(self.__wal.fileno())
+            self.__snapshot_lsn = self.__applied_lsn
+
+    def open_account(self, account_id, balance):
+        # one BankAccount per id, so every ATM debits through the same account lock
+        with self.__open_lock:
+            account = self.__bank_accounts.get(account_id)
+            if account is not None:
+                return account
+            with self.__lock:
+                known = account_id in self.__accounts
+                if known:
+                    balance = self.__accounts[account_id]
+            if not known:
+                self.__append({"type": "account", "account": account_id, "balance": balance})
+            account = BankAccount(balance, account_id)
+            self.__bank_accounts[account_id] = account
+            return account
+
+    def get_cassettes(self, atm_id):
+        with self.__lock:
+            cassettes = self.__cassettes.get(atm_id)
+            return dict(cassettes) if cassettes is not None else None
+
+    def is_tracked(self, atm_id, account_id):
+        with self.__lock:
+            return atm_id in self.__cassettes and account_id in self.__accounts
+
+    def get_account_balance(self, account_id):
+        with self.__lock:
+            return self.__accounts.get(account_id)
+
+    def log_cassettes(self, atm_id, cassettes):
+        self.__append({"type": "cassettes", "atm": atm_id, "counts": list(cassettes.items())})
+
+    def log_withdrawal(self, atm_id, account_id, amount, notes):
+        self.__append({"type": "withdrawal", "atm": atm_id, "account": account_id, "amount": amount, "notes": list(notes.items())})
+
+    def close(self):
+        with self.__io_lock:
+            self.__wal.close()
+
+
+class ReplenishmentForecaster(EventSink):
+    '''
+    Listens to the notes dispensed by every ATM and keeps an exponentially
+    decayed demand per cassette, which gives a note rate and from that the time
+    left before each cassette runs dry
+    '''
+    def __init__(self, denominations=ATM.DENOMINATIONS, half_life=24 * 3600):
+        self.denominations = tuple(denominations)
+        self.half_life = half_life
+        self.__demand = {}
+        self.__last_seen = {}
+        self.__lock = threading.Lock()
+
+    def emit(self, event_type, **fields):
+        if event_type == EventType.NOTES_DISPENSED:
+            self.observe(fields["atm_id"], fields["notes"], time.time())
+
+    def __decayed(self, atm_id, timestamp):
+        demand = self.__demand.get(atm_id)
+        if demand is None:
+            return [0.0] * len(self.denominations)
+        decay = 0.5 ** (max(timestamp - self.__last_seen[atm_id], 0) / self.half_life)
+        return [count * decay for count in demand]
+
+    def observe(self, atm_id, notes, timestamp):
+        with self.__lock:
+            demand = self.__decayed(atm_id, timestamp)
+            for index, denomination in enumerate(self.denominations):
+                demand[index] += notes.get(denomination, 0)
+            self.__demand[atm_id] = demand
+            self.__last_seen[atm_id] = timestamp
+
+    def get_note_rates(self, atm_id, now=None):
+        # a decayed sum of events divided by the mean weight lifetime is a rate per second
+        now = time.time() if now is None else now
+        with self.__lock:
+            demand = self.__decayed(atm_id, now)
+        scale = math.log(2) / self.half_life
+        return {denomination: count * scale for denomination, count in zip(self.denominations, demand)}
+
+    def time_to_empty(self, atm_id, cassettes, now=None):
+        rates = self.get_note_rates(atm_id, now)
+        return {denomination: cassettes.get(denomination, 0) / rate if rate > 0 else math.inf for denomination, rate in rates.items()}
+
+    def forecast(self, cassettes_by_atm, now=None):
+        '''
+        Returns (seconds to empty, atm id, denomination) for every cassette,
+        the ones running out first at the front
+        '''
+        now = time.time() if now is None else now
+        forecast = []
+        for atm_id, cassettes in cassettes_by_atm.items():
+            for denomination, seconds in self.time_to_empty(atm_id, cassettes, now).items():
+                forecast.append((seconds, atm_id, denomination))
+        forecast.sort(key=lambda entry: entry[0])
+        return forecast
+
+    def due_for_refill(self, cassettes_by_atm, horizon, now=None):
+        due = []
+        for seconds, atm_id, denomination in self.forecast(cassettes_by_atm, now):
+            if seconds > horizon:
+                break
+            if atm_id not in due:
+                due.append(atm_id)
+        return due
+
+
+class FleetReport:
+    def __init__(self, latencies, status_counts, elapsed):
+        self.transaction_count = len(latencies)
+        self.status_counts = status_counts
+        self.elapsed = elapsed
+        self.throughput = self.transaction_count / elapsed if elapsed > 0 else 0
+        latencies = sorted(latencies)
+        self.p50_latency = self.__percentile(latencies, 50)
+        self.p99_latency = self.__percentile(latencies, 99)
+
+    @staticmethod
+    def __percentile(latencies, percent):
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, len(latencies) * percent // 100)]
+
+    def show(self):
+        print("Transactions: ", self.transaction_count)
+        print("Elapsed (s): ", round(self.elapsed, 3))
+        print("Throughput (tx/s): ", round(self.throughput))
+        print("p50 latency (us): ", round(self.p50_latency * 1e6, 1))
+        print("p99 latency (us): ", round(self.p99_latency * 1e6, 1))
+        for status, count in self.status_counts.items():
+            print(status, count)
+
+class ATMFleet:
+    '''
+    Runs many ATMs at once against the same accounts. Each ATM is driven by a
+    single worker so its cassettes stay single threaded, while the accounts
+    rely on their own locks.
+    '''
+    def __init__(self, atms):
+        self.atms = atms
+
+    def __run_atm(self, atm, transactions):
+        latencies = []
+        status_counts = {}
+        for transaction in transactions:
+            start = time.perf_counter()
+            result = atm.process_transaction(transaction)
+            latencies.append(time.perf_counter() - start)
+            status_counts[result.status] = status_counts.get(result.status, 0) + 1
+        return latencies, status_counts
+
+    def run(self, transactions_per_atm):
+        latencies = []
+        status_counts = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.atms)) as executor:
+            futures = [executor.submit(self.__run_atm, atm, transactions) for atm, transactions in zip(self.atms, transactions_per_atm)]
+            for future in futures:
+                atm_latencies, atm_status_counts = future.result()
+                latencies.extend(atm_latencies)
+                for status, count in atm_status_counts.items():
+                    status_counts[status] = status_counts.get(status, 0) + count
+        elapsed = time.perf_counter() - start
+        return FleetReport(latencies, status_counts, elapsed)
 
 
 if __name__ == "__main__":
@@ -364,4 +1230,58 @@ if __name__ == "__main__":
     atm.get_curr_atm_state().authenticate_pin(atm, card, "1234")
     atm.get_curr_atm_state().select_operation(atm, card, TransactionType.WITHDRAWAL)
     atm.get_curr_atm_state().withdraw(atm, card, 400)
-    atm.print_atm_state()
\ No newline at end of file
+    atm.print_atm_state()
+    print("=====================================")
+
+    atm.set_atm_balance(10, 10, 10, 10)
+    console_sink = atm.get_event_sink()
+    batch_sink = RingBufferEventSink()
+    atm.set_event_sink(batch_sink)
+    results = atm.process_batch([
+        Transaction(card, "1234", TransactionType.BALANCE_CHECK),
+        Transaction(card, "0000", TransactionType.WITHDRAWAL, 10),
+        Transaction(card, "1234", TransactionType.WITHDRAWAL, 65),
+    ])
+    for result in results:
+        print(result.transaction.transaction_type, result.status, result.notes, result.balance)
+    print("Events recorded: ", len(batch_sink.get_records()))
+    atm.set_event_sink(console_sink)
+    atm.print_atm_state()
+    print("=====================================")
+
+    shared_account = BankAccount(50000)
+    # a cheap key derivation keeps the demo fast, production cards use the default verifier
+    demo_pin_verifier = PinVerifier(iterations=100)
+    shared_card = Card("5678", "5678", shared_account, demo_pin_verifier)
+    forecaster = ReplenishmentForecaster(half_life=3600)
+    fleet = ATMFleet([ATM(event_sink=forecaster, atm_id=atm_id) for atm_id in range(8)])
+    for fleet_atm in fleet.atms:
+        fleet_atm.set_atm_balance(1000, 1000, 1000, 1000)
+    report = fleet.run([[Transaction(shared_card, "5678", TransactionType.WITHDRAWAL, 25)] * 1000 for _ in fleet.atms])
+    report.show()
+    print("Shared account balance: ", shared_account.get_balance())
+    print("Due for refill within a day: ", forecaster.due_for_refill({fleet_atm.get_atm_id(): fleet_atm.get_cassettes() for fleet_atm in fleet.atms}, 24 * 3600))
+    print("=====================================")
+
+    ledger_directory = tempfile.mkdtemp()
+    ledger = Ledger(ledger_directory, snapshot_interval=50)
+    ledger_atm = ATM(event_sink=NullEventSink(), atm_id="atm-1", ledger=ledger)
+    ledger_atm.set_atm_balance(10, 10, 10, 10)
+    ledger_card = Card("4321", "4321", ledger.open_account("acc-1", 1000), demo_pin_verifier)
+    ledger_atm.process_batch([Transaction(ledger_card, "4321", TransactionType.WITHDRAWAL, 7)] * 60)
+    ledger.close()
+
+    recovered = Ledger(ledger_directory)
+    print("Recovered account balance: ", recovered.get_account_balance("acc-1"))
+    ATM(atm_id="atm-1", ledger=recovered).print_atm_state()
+    recovered.close()
+    shutil.rmtree(ledger_directory)
+    print("=====================================")
+
+    locked_card = Card("9999", "9999", BankAccount(100), demo_pin_verifier)
+    atm.set_event_sink(NullEventSink())
+    for attempt in ["0000", "1111", "2222", "9999"]:
+        print(attempt, atm.process_transaction(Transaction(locked_card, attempt, TransactionType.BALANCE_CHECK)).status)
+    pin_hash = demo_pin_verifier.hash_pin("4242")
+    print(demo_pin_verifier.verify_batch([("4242", "4242", pin_hash), ("4242", "0000", pin_hash)]))
+    demo_pin_verifier.close()
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from enum import Enum
 from collections import deque
-# import heapq
+import heapq
 
 class Direction(Enum):
     UP = 1
@@ -17,7 +17,7 @@ class Display:
         self.direction = None
     
     def show(self):
-        return self.floor + " " + self.direction
+        return str(self.floor) + " " + str(self.direction)
 
     def set_display(self, floor, direction):
         self.floor = floor
@@ -67,9 +67,9 @@ class InternalButtons:
     def press_button(self, floor):
         self.button_selected = floor
         if floor > self.elevator_car.currentFloor:
-            self.dispatcher.submit_internal_request(self.button_selected, floor, Direction.UP)
+            self.dispatcher.submit_internal_request(self.elevator_car.id, floor, Direction.UP)
         else:
-            self.dispatcher.submit_internal_request(self.button_selected, floor, Direction.DOWN)
+            self.dispatcher.submit_internal_request(self.elevator_car.id, floor, Direction.DOWN)
 
 
 class ElevatorCar:
@@ -80,7 +80,7 @@ class ElevatorCar:
         self.direction = Direction.UP
         self.status = Status.IDLE
         self.doors = Door()
-        self.internalButtons = InternalButtons()
+        self.internalButtons = InternalButtons(self)
     
     def show_display(self):
         return self.display.show()
@@ -111,28 +111,82 @@ class ElevatorController:
     '''
     One to One relationship between ElevatorController and ElevatorCar
     Each controller controls its own elevator car which is a dumb object
+
+    Requests are served with LOOK: floors above the car wait in a min heap and
+    floors below it in a max heap (negated floors), each with a set so a floor
+    is queued once. The car keeps going in its direction while that heap has
+    floors and only reverses when nothing is left ahead, so picking the next
+    stop is O(log n) however many calls are pending.
     '''
     def __init__(self, elevator_car):
         self.elevator_car = elevator_car
         self.up_minheap = []
         self.down_maxheap = []
+        self.up_floors = set()
+        self.down_floors = set()
         self.pending_requests = deque()
 
-    def submit_new_request(self, floor, direction):
-        if direction == Direction.UP:
-            self.up_minheap.append(floor)
+    def add_request(self, floor, direction):
+        # LOOK stops at every requested floor on its way, so the heap is
+        # picked by where the floor is, the button direction only matters
+        # for the display
+        current_floor = self.elevator_car.currentFloor
+        if floor > current_floor:
+            if floor not in self.up_floors:
+                self.up_floors.add(floor)
+                heapq.heappush(self.up_minheap, floor)
+        elif floor < current_floor:
+            if floor not in self.down_floors:
+                self.down_floors.add(floor)
+                heapq.heappush(self.down_maxheap, -floor)
         else:
-            self.down_maxheap.append(floor)
-        
+            self.pending_requests.append(floor)
+
+    def submit_new_request(self, floor, direction):
+        self.add_request(floor, direction)
         self.process_request()
-    
+
+    def has_requests(self):
+        return bool(self.pending_requests or self.up_minheap or self.down_maxheap)
+
+    def next_stop(self):
+        if self.pending_requests:
+            return self.pending_requests.popleft(), self.elevator_car.direction
+        if self.elevator_car.direction == Direction.UP and not self.up_minheap:
+            self.elevator_car.direction = Direction.DOWN
+        elif self.elevator_car.direction == Direction.DOWN and not self.down_maxheap:
+            self.elevator_car.direction = Direction.UP
+
+        if self.elevator_car.direction == Direction.UP and self.up_minheap:
+            floor = heapq.heappop(self.up_minheap)
+            self.up_floors.discard(floor)
+            return floor, Direction.UP
+        if self.elevator_car.direction == Direction.DOWN and self.down_maxheap:
+            floor = -heapq.heappop(self.down_maxheap)
+            self.down_floors.discard(floor)
+            return floor, Direction.DOWN
+        return None, None
+
+    def step(self):
+        floor, direction = self.next_stop()
+        if floor is None:
+            self.elevator_car.status = Status.IDLE
+            return None
+        self.elevator_car.status = Status.MOVING
+        self.elevator_car.moveElevator(direction, floor)
+        self.elevator_car.doors.open()
+        self.elevator_car.doors.close()
+        return floor
+
     def process_request(self):
-        pass
+        while self.has_requests():
+            self.step()
+        self.elevator_car.status = Status.IDLE
         
 class ExternalDispatcher:
     elevator_controller_list = ElevatorCreator.elevator_controllers
-    def __init__(self, strategy):
-        self.strategy = strategy
+    def __init__(self, strategy=None):
+        self.strategy = strategy if strategy else FixedStrategy()
 
     def submit_external_request(self, floor, direction):
         self.strategy.process(ExternalDispatcher.elevator_controller_list, floor, direction)    
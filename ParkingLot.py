@@ -1,9 +1,73 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import Enum
+import heapq
+import itertools
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 class VehicleType(Enum):
     TWO_WHEELER = 1
     FOUR_WHEELER = 2
+    COMPACT = 3
+    LARGE = 4
+    EV = 5
+    HANDICAP = 6
+
+class SpotType(Enum):
+    TWO_WHEELER = 1
+    FOUR_WHEELER = 2
+    COMPACT = 3
+    LARGE = 4
+    EV = 5
+    HANDICAP = 6
+
+VEHICLE_SIZES = {
+    VehicleType.TWO_WHEELER: 0,
+    VehicleType.COMPACT: 1,
+    VehicleType.FOUR_WHEELER: 2,
+    VehicleType.EV: 2,
+    VehicleType.HANDICAP: 2,
+    VehicleType.LARGE: 3,
+}
+
+SPOT_SIZES = {
+    SpotType.TWO_WHEELER: 0,
+    SpotType.COMPACT: 1,
+    SpotType.FOUR_WHEELER: 2,
+    SpotType.EV: 2,
+    SpotType.HANDICAP: 2,
+    SpotType.LARGE: 3,
+}
+
+# these spots are kept for one kind of vehicle only
+RESERVED_SPOTS = {
+    SpotType.EV: VehicleType.EV,
+    SpotType.HANDICAP: VehicleType.HANDICAP,
+}
+
+def buildCompatibility():
+    '''
+    For every vehicle type, the spot types it may use in the order they should
+    be tried: its reserved spot type first, then the smallest spot it fits in,
+    then larger ones.
+    '''
+    compatibility = {}
+    for vehicleType in VehicleType:
+        spotTypes = [spotType for spotType in SpotType
+                     if SPOT_SIZES[spotType] >= VEHICLE_SIZES[vehicleType] and RESERVED_SPOTS.get(spotType, vehicleType) == vehicleType]
+        spotTypes.sort(key=lambda spotType: (spotType not in RESERVED_SPOTS, SPOT_SIZES[spotType]))
+        compatibility[vehicleType] = tuple(spotTypes)
+    return compatibility
+
+SPOT_FIT_ORDER = buildCompatibility()
+COMPATIBLE_PAIRS = frozenset((vehicleType, spotType) for vehicleType, spotTypes in SPOT_FIT_ORDER.items() for spotType in spotTypes)
 
 class ParkingSpot():
     def __init__(self, spotId, x, y, type, vehicle=None):
@@ -12,118 +76,290 @@ class ParkingSpot():
         self.y = y
         self.vehicle = vehicle
         self.type = type
+        self.entryTime = None
+        self.observers = []
     
     def isAvailable(self):
         return self.vehicle == None
 
+    def canFit(self, vehicle):
+        return (vehicle.type, self.type) in COMPATIBLE_PAIRS
+
+    def registerObserver(self, observer):
+        self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+
     def park(self, vehicle):
+        if not self.canFit(vehicle):
+            print(self.type.name, "spot cannot take a", vehicle.type.name, "vehicle")
+            return
+        wasAvailable = self.isAvailable()
         self.vehicle = vehicle
+        self.entryTime = time.time()
+        if wasAvailable:
+            for observer in self.observers:
+                observer.spotOccupied(self)
     
     def leave(self):
+        wasAvailable = self.isAvailable()
         self.vehicle = None
+        self.entryTime = None
+        if not wasAvailable:
+            for observer in self.observers:
+                observer.spotReleased(self)
 
 class TwoWheelerSpot(ParkingSpot):
     def __init__(self, spotId, x, y, vehicle=None):
-        super().__init__(spotId, x, y, VehicleType.TWO_WHEELER, vehicle)
+        super().__init__(spotId, x, y, SpotType.TWO_WHEELER, vehicle)
         self.price = 10
-    
-    def park(self, vehicle):
-        if vehicle.type == VehicleType.TWO_WHEELER:
-            super().park(vehicle)
-        else:
-            print("Two wheeler spot is only for two wheelers")
-    
-    def leave(self):
-        super().leave()
+
+class CompactSpot(ParkingSpot):
+    def __init__(self, spotId, x, y, vehicle=None):
+        super().__init__(spotId, x, y, SpotType.COMPACT, vehicle)
+        self.price = 15
 
 class FourWheelerSpot(ParkingSpot):
     def __init__(self, spotId, x, y, vehicle=None):
-        super().__init__(spotId, x, y, VehicleType.FOUR_WHEELER, vehicle)
+        super().__init__(spotId, x, y, SpotType.FOUR_WHEELER, vehicle)
         self.price = 20
-    
-    def park(self, vehicle):
-        if vehicle.type == VehicleType.FOUR_WHEELER:
-            super().park(vehicle)
-        else:
-            print("Four wheeler spot is only for four wheelers")
-    
-    def leave(self):
-        super().leave()
 
-class ParkingSpotManager(ABC):
-    def __init__(self):
-        self.spots = []
+class LargeSpot(ParkingSpot):
+    def __init__(self, spotId, x, y, vehicle=None):
+        super().__init__(spotId, x, y, SpotType.LARGE, vehicle)
+        self.price = 30
+
+class EVSpot(ParkingSpot):
+    def __init__(self, spotId, x, y, vehicle=None):
+        super().__init__(spotId, x, y, SpotType.EV, vehicle)
+        self.price = 25
+
+class HandicapSpot(ParkingSpot):
+    def __init__(self, spotId, x, y, vehicle=None):
+        super().__init__(spotId, x, y, SpotType.HANDICAP, vehicle)
+        self.price = 10
+
+class ParkingSpotManager():
+    '''
+    Owns the spots of one floor and keeps a min-heap of free spot ids per spot
+    type, so the lowest free spot of a type is found in O(log n). Spots that
+    got taken are dropped from the heap lazily the next time they reach the top,
+    and a freed spot is only pushed when it is not in the heap already, so a
+    heap never holds more entries than the floor has spots of its type.
+
+    A vehicle is offered its compatible spot types in SPOT_FIT_ORDER, so it
+    lands in the best fitting spot and only falls back to larger ones when
+    those are full.
+
+    Finding a spot and parking in it happen under the floor's lock, so gates
+    can never book the same spot, while bookings on different floors never
+    contend.
+
+    Total and free counts per spot type are kept up to date on every park and
+    leave, and observers are told the new free count of the spot type that
+    changed.
+    '''
+    def __init__(self, floorNumber=0):
+        self.floorNumber = floorNumber
+        self.spots = {}
+        self.freeSpots = {spotType: [] for spotType in SpotType}
+        self.freeSpotIds = {spotType: set() for spotType in SpotType}  # ids in freeSpots, live or stale
+        self.freeCount = {spotType: 0 for spotType in SpotType}
+        self.spotCount = {spotType: 0 for spotType in SpotType}
         self.parkingStrategy = DefaultParkingStrategy()
+        self.observers = []
+        # reentrant since park/leave call back into spotOccupied/spotReleased
+        self.lock = threading.RLock()
+
+    def registerObserver(self, observer):
+        self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+
+    def notifyObservers(self, spotType):
+        for observer in self.observers:
+            observer.availabilityChanged(self.floorNumber, spotType, self.freeCount[spotType], self.spotCount[spotType])
     
     def addSpot(self, spot):
-        self.spots.append(spot)
+        with self.lock:
+            self.spots[spot.spotId] = spot
+            self.spotCount[spot.type] += 1
+            spot.registerObserver(self)
+            if spot.isAvailable():
+                self.__pushFreeSpot(spot)
+                self.freeCount[spot.type] += 1
+                self.parkingStrategy.spotReleased(self, spot)
+            self.notifyObservers(spot.type)
+
+    def __pushFreeSpot(self, spot):
+        freeSpotIds = self.freeSpotIds[spot.type]
+        if spot.spotId not in freeSpotIds:
+            freeSpotIds.add(spot.spotId)
+            heapq.heappush(self.freeSpots[spot.type], spot.spotId)
     
     def removeSpot(self, spot):
-        self.spots.remove(spot)
+        with self.lock:
+            del self.spots[spot.spotId]
+            self.spotCount[spot.type] -= 1
+            spot.removeObserver(self)
+            if spot.isAvailable():
+                self.freeCount[spot.type] -= 1
+            self.notifyObservers(spot.type)
     
     def addSpots(self, spots):
-        self.spots.extend(spots)
+        # one heapify per spot type instead of a push per spot
+        with self.lock:
+            changed = set()
+            for spot in spots:
+                self.spots[spot.spotId] = spot
+                self.spotCount[spot.type] += 1
+                spot.registerObserver(self)
+                if spot.isAvailable():
+                    if spot.spotId not in self.freeSpotIds[spot.type]:
+                        self.freeSpotIds[spot.type].add(spot.spotId)
+                        self.freeSpots[spot.type].append(spot.spotId)
+                    self.freeCount[spot.type] += 1
+                    self.parkingStrategy.spotReleased(self, spot)
+                changed.add(spot.type)
+            for spotType in changed:
+                heapq.heapify(self.freeSpots[spotType])
+                self.notifyObservers(spotType)
     
     def removeSpots(self, spots):
         for spot in spots:
-            self.spots.remove(spot)
+            self.removeSpot(spot)
+
+    def spotOccupied(self, spot):
+        with self.lock:
+            self.freeCount[spot.type] -= 1
+            self.notifyObservers(spot.type)
+
+    def spotReleased(self, spot):
+        with self.lock:
+            self.__pushFreeSpot(spot)
+            self.freeCount[spot.type] += 1
+            self.parkingStrategy.spotReleased(self, spot)
+            self.notifyObservers(spot.type)
+
+    def setParkingStrategy(self, parkingStrategy):
+        with self.lock:
+            self.parkingStrategy = parkingStrategy
+
+    def peekFreeSpot(self, spotType):
+        with self.lock:
+            freeSpots = self.freeSpots[spotType]
+            while freeSpots:
+                spot = self.spots.get(freeSpots[0])
+                # the id may have been removed, or reused by a spot of another type
+                if spot is not None and spot.type == spotType and spot.isAvailable():
+                    return spot
+                self.freeSpotIds[spotType].discard(heapq.heappop(freeSpots))
+            return None
     
     def getAvailableSpots(self):
-        return [spot for spot in self.spots if spot.isAvailable()]
+        return [spot for spot in self.spots.values() if spot.isAvailable()]
 
-    def findAvailableSpot(self, vehicle):
-        return self.parkingStrategy.findAvailableSpot(vehicle)
+    def getAvailableSpotCount(self, spotType=None):
+        if spotType is None:
+            return sum(self.freeCount.values())
+        return self.freeCount[spotType]
+
+    def getOccupiedSpotCount(self, spotType=None):
+        if spotType is None:
+            return sum(self.spotCount.values()) - sum(self.freeCount.values())
+        return self.spotCount[spotType] - self.freeCount[spotType]
 
-    def parkVehicle(self, vehicle):
-        spot = self.findAvailableSpot()
-        if spot:
-            spot.park(vehicle)
+    def findAvailableSpotOfType(self, spotType, gate=None):
+        with self.lock:
+            if not self.freeCount[spotType]:
+                return None
+            return self.parkingStrategy.findAvailableSpot(self, spotType, gate)
+
+    def findAvailableSpot(self, vehicle, gate=None):
+        with self.lock:
+            for spotType in SPOT_FIT_ORDER[vehicle.type]:
+                spot = self.findAvailableSpotOfType(spotType, gate)
+                if spot:
+                    return spot
+            return None
+
+    def parkVehicleInSpotType(self, vehicle, spotType, gate=None):
+        with self.lock:
+            spot = self.findAvailableSpotOfType(spotType, gate)
+            if spot:
+                spot.park(vehicle)
             return spot
-        return None
 
-    def leaveSpot(self, spot):
-        spot.leave()
-    
-class TwoWheelerSpotManager(ParkingSpotManager):
-    def addSpots(self, spots):
-        return super().addSpots(spots)
-    
-    def parkVehicle(self, vehicle):
-        if vehicle.__class__.__name__ == "TwoWheeler":
-            return super().parkVehicle(vehicle)
-        else:
-            print("Two wheeler spot is only for two wheelers")
-    
-    def leaveSpot(self, spot):
-        super().leaveSpot(spot)
+    def parkVehicle(self, vehicle, gate=None):
+        with self.lock:
+            spot = self.findAvailableSpot(vehicle, gate)
+            if spot:
+                spot.park(vehicle)
+                return spot
+            return None
 
-class FourWheelerSpotManager(ParkingSpotManager):
-    def addSpots(self, spots):
-        return super().addSpots(spots)
-    
-    def parkVehicle(self, vehicle):
-        if vehicle.__class__.__name__ == "FourWheeler":
-            return super().parkVehicle(vehicle)
-        else:
-            print("Four wheeler spot is only for four wheelers")
-    
     def leaveSpot(self, spot):
-        super().leaveSpot(spot)
+        with self.lock:
+            spot.leave()
 
 class ParkingStrategy(ABC):
     @abstractmethod
-    def findAvailableSpot(self, vehicle):
+    def findAvailableSpot(self, spotManager, spotType, gate=None):
         pass
 
-class NearestSpotParkingStrategy(ParkingStrategy):
-    def findAvailableSpot(self, vehicle):
+    def spotReleased(self, spotManager, spot):
+        # called when a spot is added free or freed up again
         pass
 
-class DefaultParkingStrategy(ParkingStrategy):
-    def findAvailableSpot(self, vehicle):
-        for spot in self.spots:
-            if spot.isAvailable():
+class NearestSpotParkingStrategy(ParkingStrategy):
+    '''
+    Keeps one heap per (spot manager, gate, spot type) of the free spots
+    ordered by their distance to the gate, built the first time the gate asks.
+    Taken spots are skipped lazily at the top and freed spots are pushed back
+    into the heap of every gate, so a query is O(log n) instead of a scan over
+    all spots. Like the floor's own heaps, a spot is only pushed when its
+    entry is not in the heap already, so heaps of gates that stopped asking
+    stay bounded too.
+    '''
+    def __init__(self):
+        self.gateHeaps = {}  # spot manager -> {(gate, spot type): (heap of (squared distance, spot id), ids in the heap)}
+
+    @staticmethod
+    def distance(gate, spot):
+        return (spot.x - gate.x) ** 2 + (spot.y - gate.y) ** 2
+
+    def __buildHeap(self, spotManager, spotType, gate):
+        # sorted lists are valid heaps
+        heap = sorted((self.distance(gate, spot), spot.spotId) for spot in spotManager.spots.values() if spot.type == spotType and spot.isAvailable())
+        return heap, set(spotId for _, spotId in heap)
+
+    def findAvailableSpot(self, spotManager, spotType, gate=None):
+        if gate is None:
+            return spotManager.peekFreeSpot(spotType)
+        heaps = self.gateHeaps.setdefault(spotManager, {})
+        entry = heaps.get((gate, spotType))
+        if entry is None:
+            entry = heaps[(gate, spotType)] = self.__buildHeap(spotManager, spotType, gate)
+        heap, spotIds = entry
+        while heap:
+            spot = spotManager.spots.get(heap[0][1])
+            if spot is not None and spot.type == spotType and spot.isAvailable():
                 return spot
+            spotIds.discard(heapq.heappop(heap)[1])
+        return None
+
+    def spotReleased(self, spotManager, spot):
+        for (gate, spotType), (heap, spotIds) in self.gateHeaps.get(spotManager, {}).items():
+            if spotType == spot.type and spot.spotId not in spotIds:
+                spotIds.add(spot.spotId)
+                heapq.heappush(heap, (self.distance(gate, spot), spot.spotId))
+
+class DefaultParkingStrategy(ParkingStrategy):
+    def findAvailableSpot(self, spotManager, spotType, gate=None):
+        # lowest free spot id
+        return spotManager.peekFreeSpot(spotType)
 
 
 class Vehicle(ABC):
@@ -138,6 +374,22 @@ class TwoWheeler(Vehicle):
 class FourWheeler(Vehicle):
     def __init__(self, vehicleId):
         super().__init__(vehicleId, VehicleType.FOUR_WHEELER)
+
+class CompactCar(Vehicle):
+    def __init__(self, vehicleId):
+        super().__init__(vehicleId, VehicleType.COMPACT)
+
+class LargeVehicle(Vehicle):
+    def __init__(self, vehicleId):
+        super().__init__(vehicleId, VehicleType.LARGE)
+
+class ElectricCar(Vehicle):
+    def __init__(self, vehicleId):
+        super().__init__(vehicleId, VehicleType.EV)
+
+class HandicapVehicle(Vehicle):
+    def __init__(self, vehicleId):
+        super().__init__(vehicleId, VehicleType.HANDICAP)
     
 class Ticket():
     def __init__(self, ticketId, vehicle, spot, entryTime):
@@ -145,31 +397,762 @@ class Ticket():
         self.vehicle = vehicle
         self.spot = spot
         self.entryTime = entryTime
+        self.exitTime = None
+        self.fee = None
+
+    def isActive(self):
+        return self.exitTime == None
+
+class PricingStrategy(ABC):
+    @abstractmethod
+    def calculateFee(self, ticket, exitTime):
+        pass
+
+class HourlyPricingStrategy(PricingStrategy):
+    # every started hour is charged at the spot's price
+    def calculateFee(self, ticket, exitTime):
+        hours = max(1, math.ceil((exitTime - ticket.entryTime) / 3600))
+        return hours * ticket.spot.price
+
+class DailyCapPricingStrategy(PricingStrategy):
+    # wraps another strategy and caps what is charged for each started day
+    def __init__(self, pricingStrategy, dailyCap):
+        self.pricingStrategy = pricingStrategy
+        self.dailyCap = dailyCap
+
+    def calculateFee(self, ticket, exitTime):
+        days, remainder = divmod(exitTime - ticket.entryTime, 86400)
+        fee = int(days) * self.dailyCap
+        if remainder > 0 or days == 0:
+            partial = Ticket(ticket.ticketId, ticket.vehicle, ticket.spot, 0)
+            fee += min(self.dailyCap, self.pricingStrategy.calculateFee(partial, remainder))
+        return fee
+
+class HourlyStats():
+    def __init__(self):
+        self.revenue = 0
+        self.entries = 0
+        self.exits = 0
+        self.peakOccupancy = 0
+
+class RevenueAggregator():
+    '''
+    Rolling per-hour, per-spot-type revenue and occupancy, updated as tickets
+    open and close. Only the last windowHours hours are kept and the window
+    totals are maintained incrementally, so dashboards never scan tickets.
+    '''
+    def __init__(self, windowHours=24 * 7):
+        self.windowHours = windowHours
+        self.buckets = OrderedDict()  # hour -> {spot type: HourlyStats}
+        self.windowRevenue = {}
+        self.occupancy = {}
+
+    def __bucket(self, timestamp, type):
+        hour = int(timestamp // 3600)
+        if hour not in self.buckets:
+            self.buckets[hour] = {}
+            # tickets arrive roughly in time order, so old hours sit at the front
+            while next(iter(self.buckets)) <= hour - self.windowHours:
+                _, expired = self.buckets.popitem(last=False)
+                for expiredType, stats in expired.items():
+                    self.windowRevenue[expiredType] -= stats.revenue
+        stats = self.buckets[hour].get(type)
+        if stats is None:
+            stats = self.buckets[hour][type] = HourlyStats()
+            stats.peakOccupancy = self.occupancy.get(type, 0)
+        return stats
+
+    def recordEntry(self, ticket):
+        type = ticket.spot.type
+        self.occupancy[type] = self.occupancy.get(type, 0) + 1
+        stats = self.__bucket(ticket.entryTime, type)
+        stats.entries += 1
+        stats.peakOccupancy = max(stats.peakOccupancy, self.occupancy[type])
+
+    def recordExit(self, ticket):
+        type = ticket.spot.type
+        stats = self.__bucket(ticket.exitTime, type)
+        self.occupancy[type] -= 1
+        stats.exits += 1
+        stats.revenue += ticket.fee
+        self.windowRevenue[type] = self.windowRevenue.get(type, 0) + ticket.fee
+
+    def getHourlyStats(self, timestamp, type):
+        return self.buckets.get(int(timestamp // 3600), {}).get(type)
+
+    def getRevenue(self, type=None):
+        if type is None:
+            return sum(self.windowRevenue.values())
+        return self.windowRevenue.get(type, 0)
+
+    def getOccupancy(self, type):
+        return self.occupancy.get(type, 0)
+
+class TicketManager():
+    '''
+    Issues and closes tickets. Tickets are indexed by id and active ones by
+    plate, so both lookups are O(1).
+    '''
+    def __init__(self, revenueAggregator=None):
+        self.tickets = {}
+        self.activeTickets = {}  # plate -> ticket
+        self.reservedPlates = set()  # plates being booked by a gate
+        self.ticketIds = itertools.count(1)
+        self.revenueAggregator = revenueAggregator if revenueAggregator else RevenueAggregator()
+        self.lock = threading.Lock()
+
+    def reservePlate(self, plate):
+        # the duplicate check and the reservation are one step, so when two
+        # entrance gates race on a plate only one of them gets True
+        with self.lock:
+            if plate in self.activeTickets or plate in self.reservedPlates:
+                return False
+            self.reservedPlates.add(plate)
+            return True
+
+    def releasePlate(self, plate):
+        with self.lock:
+            self.reservedPlates.discard(plate)
+
+    def issueTicket(self, vehicle, spot, entryTime):
+        with self.lock:
+            ticket = Ticket(next(self.ticketIds), vehicle, spot, entryTime)
+            self.tickets[ticket.ticketId] = ticket
+            self.reservedPlates.discard(vehicle.vehicleId)
+            self.activeTickets[vehicle.vehicleId] = ticket
+            self.revenueAggregator.recordEntry(ticket)
+            return ticket
+
+    def closeTicket(self, ticket, exitTime, fee):
+        # the active check and the close are one step, so when two exit gates
+        # race on a ticket only one of them gets True
+        with self.lock:
+            if not ticket.isActive():
+                return False
+            ticket.exitTime = exitTime
+            ticket.fee = fee
+            del self.activeTickets[ticket.vehicle.vehicleId]
+            self.revenueAggregator.recordExit(ticket)
+            return True
+
+    def getTicket(self, ticketId):
+        return self.tickets.get(ticketId)
+
+    def getActiveTicketByPlate(self, plate):
+        return self.activeTickets.get(plate)
+
+DEFAULT_TICKET_MANAGER = TicketManager()
+
+class ParkingLot():
+    '''
+    A lot made of floors, each a ParkingSpotManager with its own lock. A
+    vehicle gets the best fitting spot type free anywhere in the lot, on the
+    lowest floor that has one. One shared lot is handed out to all gates.
+    '''
+    instance = None
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.floors = []
+        self.spotFloors = {}  # spot id -> floor
+        self.observers = []
 
-class ParkingSpotManagerFactory():
     @staticmethod
-    def getSpotManager(type):
-        if type == VehicleType.TWO_WHEELER:
-            return TwoWheelerSpotManager()
-        elif type == VehicleType.FOUR_WHEELER:
-            return FourWheelerSpotManager()
-        else:
+    def getInstance():
+        if ParkingLot.instance is None:
+            with ParkingLot.lock:
+                if ParkingLot.instance is None:
+                    ParkingLot.instance = ParkingLot()
+        return ParkingLot.instance
+
+    @staticmethod
+    def reset():
+        with ParkingLot.lock:
+            ParkingLot.instance = None
+
+    def addFloor(self, spots=(), parkingStrategy=None):
+        floor = ParkingSpotManager(len(self.floors))
+        if parkingStrategy:
+            floor.setParkingStrategy(parkingStrategy)
+        for observer in self.observers:
+            floor.registerObserver(observer)
+        self.floors.append(floor)
+        self.addSpots(floor.floorNumber, spots)
+        return floor
+
+    def addSpots(self, floorNumber, spots):
+        floor = self.floors[floorNumber]
+        spots = list(spots)
+        for spot in spots:
+            self.spotFloors[spot.spotId] = floor
+        floor.addSpots(spots)
+
+    def registerObserver(self, observer):
+        # observers hear about every floor, including ones added later
+        self.observers.append(observer)
+        for floor in self.floors:
+            floor.registerObserver(observer)
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+        for floor in self.floors:
+            floor.removeObserver(observer)
+
+    def getFloor(self, spot):
+        return self.spotFloors.get(spot.spotId)
+
+    def getAvailableSpotCount(self, spotType=None, floorNumber=None):
+        if floorNumber is not None:
+            return self.floors[floorNumber].getAvailableSpotCount(spotType)
+        return sum(floor.getAvailableSpotCount(spotType) for floor in self.floors)
+
+    def getOccupiedSpotCount(self, spotType=None, floorNumber=None):
+        if floorNumber is not None:
+            return self.floors[floorNumber].getOccupiedSpotCount(spotType)
+        return sum(floor.getOccupiedSpotCount(spotType) for floor in self.floors)
+
+    # spot types come first and floors second, so a larger spot is only used
+    # when no better fitting one is free on any floor
+
+    def findAvailableSpot(self, vehicle, gate=None):
+        for spotType in SPOT_FIT_ORDER[vehicle.type]:
+            for floor in self.floors:
+                if floor.freeCount[spotType]:
+                    spot = floor.findAvailableSpotOfType(spotType, gate)
+                    if spot:
+                        return spot
+        return None
+
+    def parkVehicle(self, vehicle, gate=None):
+        for spotType in SPOT_FIT_ORDER[vehicle.type]:
+            for floor in self.floors:
+                # unlocked read to skip full floors, the floor checks again under its lock
+                if floor.freeCount[spotType]:
+                    spot = floor.parkVehicleInSpotType(vehicle, spotType, gate)
+                    if spot:
+                        return spot
+        return None
+
+    def leaveSpot(self, spot):
+        self.spotFloors[spot.spotId].leaveSpot(spot)
+
+SPOT_CLASSES = {
+    SpotType.TWO_WHEELER: TwoWheelerSpot,
+    SpotType.COMPACT: CompactSpot,
+    SpotType.FOUR_WHEELER: FourWheelerSpot,
+    SpotType.LARGE: LargeSpot,
+    SpotType.EV: EVSpot,
+    SpotType.HANDICAP: HandicapSpot,
+}
+
+VEHICLE_CLASSES = {
+    VehicleType.TWO_WHEELER: TwoWheeler,
+    VehicleType.COMPACT: CompactCar,
+    VehicleType.FOUR_WHEELER: FourWheeler,
+    VehicleType.LARGE: LargeVehicle,
+    VehicleType.EV: ElectricCar,
+    VehicleType.HANDICAP: HandicapVehicle,
+}
+
+class ParkingStateStore():
+    '''
+    Keeps the spot table on disk so a restarted controller comes back with
+    every vehicle where it was.
+
+    The snapshot is a binary table of fixed width records (spot id, floor,
+    position, spot type, occupant, entry time) followed by the plates, read
+    back through mmap. Every park and leave after it is appended to a journal
+    as the spot's new state. Replaying a record twice is harmless, so the
+    snapshot can be taken while gates keep parking. Every snapshotInterval
+    records a new snapshot is written and the journal is truncated.
+
+    Only occupancy is journaled: call snapshot() after changing the layout.
+    '''
+    SNAPSHOT_FILE = "spots.snapshot"
+    JOURNAL_FILE = "spots.journal"
+    MAGIC = b"PKLT"
+    HEADER = struct.Struct("<4sIQI")  # magic, version, spot count, plate bytes
+    RECORD = struct.Struct("<qHddBBBdIH")  # spot id, floor, x, y, spot type, vehicle type, plate kind, entry time, plate offset, plate length
+    JOURNAL_RECORD = struct.Struct("<qBBdH")  # spot id, vehicle type, plate kind, entry time, plate length
+    EMPTY = 0
+    STRING_PLATE = 1
+    INT_PLATE = 2
+
+    # keyed by enum value, as stored on disk
+    SPOT_CLASSES_BY_VALUE = {spotType.value: spotClass for spotType, spotClass in SPOT_CLASSES.items()}
+    VEHICLE_CLASSES_BY_VALUE = {vehicleType.value: vehicleClass for vehicleType, vehicleClass in VEHICLE_CLASSES.items()}
+
+    def __init__(self, directory, snapshotInterval=10000, fsyncEachRecord=False):
+        self.directory = directory
+        self.snapshotInterval = snapshotInterval
+        self.fsyncEachRecord = fsyncEachRecord
+        self.snapshotPath = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.journalPath = os.path.join(directory, self.JOURNAL_FILE)
+        self.parkingLot = None
+        self.journal = None
+        self.journalRecords = 0
+        self.attachedSpots = []
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def encodePlate(vehicle):
+        if vehicle is None:
+            return ParkingStateStore.EMPTY, 0, b""
+        plate = vehicle.vehicleId
+        kind = ParkingStateStore.INT_PLATE if isinstance(plate, int) else ParkingStateStore.STRING_PLATE
+        return kind, vehicle.type.value, str(plate).encode()
+
+    @staticmethod
+    def decodeVehicle(kind, vehicleType, plate):
+        if kind == ParkingStateStore.EMPTY:
             return None
+        plate = plate.decode()
+        return ParkingStateStore.VEHICLE_CLASSES_BY_VALUE[vehicleType](int(plate) if kind == ParkingStateStore.INT_PLATE else plate)
+
+    def attach(self, parkingLot, snapshot=True):
+        # journals every park and leave of the lot's current spots from now on
+        self.parkingLot = parkingLot
+        for floor in parkingLot.floors:
+            for spot in floor.spots.values():
+                spot.registerObserver(self)
+                self.attachedSpots.append(spot)
+        if snapshot:
+            self.snapshot()
+        else:
+            self.journal = open(self.journalPath, "ab")
+
+    def snapshot(self):
+        with self.lock:
+            records = []
+            plates = bytearray()
+            for floor in self.parkingLot.floors:
+                for spot in list(floor.spots.values()):
+                    kind, vehicleType, plate = self.encodePlate(spot.vehicle)
+                    records.append(self.RECORD.pack(spot.spotId, floor.floorNumber, spot.x, spot.y, spot.type.value, vehicleType, kind,
+                                                    spot.entryTime or 0.0, len(plates), len(plate)))
+                    plates += plate
+            temp_path = self.snapshotPath + ".tmp"
+            with open(temp_path, "wb") as file:
+                file.write(self.HEADER.pack(self.MAGIC, 1, len(records), len(plates)))
+                file.write(b"".join(records))
+                file.write(plates)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.snapshotPath)
+
+            if self.journal:
+                self.journal.close()
+            self.journal = open(self.journalPath, "wb")
+            os.fsync(self.journal.fileno())
+            self.journalRecords = 0
+
+    def __append(self, spot):
+        kind, vehicleType, plate = self.encodePlate(spot.vehicle)
+        with self.lock:
+            if self.journal is None:
+                return  # closed
+            self.journal.write(self.JOURNAL_RECORD.pack(spot.spotId, vehicleType, kind, spot.entryTime or 0.0, len(plate)) + plate)
+            self.journal.flush()
+            if self.fsyncEachRecord:
+                os.fsync(self.journal.fileno())
+            self.journalRecords += 1
+            due = self.journalRecords >= self.snapshotInterval
+        if due:
+            self.snapshot()
+
+    def spotOccupied(self, spot):
+        self.__append(spot)
+
+    def spotReleased(self, spot):
+        self.__append(spot)
+
+    def sync(self):
+        with self.lock:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def restore(self, parkingStrategy=None):
+        '''
+        Rebuilds the lot from the snapshot and the journal written after it,
+        then attaches to it and keeps appending to the same journal.
+        '''
+        spots = {}
+        floors = {}
+        with open(self.snapshotPath, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        with mapping:
+            magic, version, count, platesLength = self.HEADER.unpack_from(mapping, 0)
+            if magic != self.MAGIC:
+                raise ValueError("Not a parking lot snapshot: " + self.snapshotPath)
+            platesStart = self.HEADER.size + count * self.RECORD.size
+            for spotId, floorNumber, x, y, spotType, vehicleType, kind, entryTime, plateOffset, plateLength in \
+                    self.RECORD.iter_unpack(mapping[self.HEADER.size:platesStart]):
+                spot = self.SPOT_CLASSES_BY_VALUE[spotType](spotId, x, y)
+                plate = mapping[platesStart + plateOffset:platesStart + plateOffset + plateLength]
+                spot.vehicle = self.decodeVehicle(kind, vehicleType, plate)
+                spot.entryTime = entryTime if spot.vehicle else None
+                spots[spotId] = spot
+                floors.setdefault(floorNumber, []).append(spot)
+
+        journal = b""
+        if os.path.exists(self.journalPath):
+            with open(self.journalPath, "rb") as file:
+                journal = file.read()
+        offset = 0
+        while offset + self.JOURNAL_RECORD.size <= len(journal):
+            spotId, vehicleType, kind, entryTime, plateLength = self.JOURNAL_RECORD.unpack_from(journal, offset)
+            plateStart = offset + self.JOURNAL_RECORD.size
+            if plateStart + plateLength > len(journal):
+                break  # torn write at the tail of the journal
+            spot = spots[spotId]
+            spot.vehicle = self.decodeVehicle(kind, vehicleType, journal[plateStart:plateStart + plateLength])
+            spot.entryTime = entryTime if spot.vehicle else None
+            offset = plateStart + plateLength
+            self.journalRecords += 1
+
+        parkingLot = ParkingLot()
+        for floorNumber in range(max(floors) + 1 if floors else 0):
+            parkingLot.addFloor(floors.get(floorNumber, []), parkingStrategy)
+        if offset < len(journal):
+            # drop the torn tail so new records follow the last whole one
+            with open(self.journalPath, "r+b") as file:
+                file.truncate(offset)
+        self.attach(parkingLot, snapshot=False)
+        return parkingLot
+
+    def close(self):
+        for spot in self.attachedSpots:
+            spot.removeObserver(self)
+        self.attachedSpots = []
+        with self.lock:
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+
+class AvailabilityFeed():
+    '''
+    Publishes free spot counts per (floor, spot type) to subscribers, such as
+    signs and mobile clients. Changes are coalesced: only the latest count of
+    each (floor, spot type) is kept, and at most once per publishInterval
+    subscribers get the entries that changed since they were last told.
+    '''
+    def __init__(self, publishInterval=1.0):
+        self.publishInterval = publishInterval
+        self.subscribers = []
+        self.pending = {}  # (floor, spot type) -> (free, total)
+        self.published = {}
+        self.lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__publisher = None
+
+    def subscribe(self, subscriber):
+        # subscriber(updates) with updates a list of (floor, spot type, free, total)
+        self.subscribers.append(subscriber)
+        with self.lock:
+            # start new subscribers off with the full picture
+            snapshot = [(floor, spotType, free, total) for (floor, spotType), (free, total) in self.published.items()]
+        if snapshot:
+            subscriber(snapshot)
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def availabilityChanged(self, floorNumber, spotType, free, total):
+        with self.lock:
+            self.pending[(floorNumber, spotType)] = (free, total)
+
+    def publish(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            updates = []
+            for key, counts in pending.items():
+                if self.published.get(key) != counts:
+                    self.published[key] = counts
+                    updates.append((key[0], key[1]) + counts)
+        if updates:
+            for subscriber in list(self.subscribers):
+                subscriber(updates)
+        return updates
+
+    def __run(self):
+        while not self.__stopped.wait(self.publishInterval):
+            self.publish()
+        self.publish()
+
+    def start(self):
+        self.__publisher = threading.Thread(target=self.__run, daemon=True)
+        self.__publisher.start()
+
+    def close(self):
+        if self.__publisher:
+            self.__stopped.set()
+            self.__publisher.join()
 
 class EntranceGate():
-    def __init__(self, x, y):
+    def __init__(self, x, y, ticketManager=DEFAULT_TICKET_MANAGER, parkingLot=None):
         self.x = x
         self.y = y    
+        self.ticketManager = ticketManager
+        self.parkingLot = parkingLot if parkingLot else ParkingLot.getInstance()
 
     def findAvailableSpot(self, vehicle):
-        ParkingSpotManager = ParkingSpotManagerFactory.getSpotManager(vehicle.type)
-        return ParkingSpotManager.findAvailableSpot(vehicle)
+        return self.parkingLot.findAvailableSpot(vehicle, self)
     
     def bookSpot(self, vehicle):
-            spot = self.findAvailableSpot(vehicle)
+            # find and park in one step under the floor's lock
+            spot = self.parkingLot.parkVehicle(vehicle, self)
             if spot:
-                spot.park(vehicle)
                 return spot
             else:
                 print("No spots available")
                 return None
+
+    def issueTicket(self, vehicle, entryTime=None):
+        if not self.ticketManager.reservePlate(vehicle.vehicleId):
+            print("Vehicle is already parked")
+            return None
+        spot = self.bookSpot(vehicle)
+        if spot is None:
+            self.ticketManager.releasePlate(vehicle.vehicleId)
+            return None
+        return self.ticketManager.issueTicket(vehicle, spot, entryTime if entryTime is not None else time.time())
+
+class ExitGate():
+    def __init__(self, x, y, pricingStrategy=None, ticketManager=DEFAULT_TICKET_MANAGER, parkingLot=None):
+        self.x = x
+        self.y = y
+        self.pricingStrategy = pricingStrategy if pricingStrategy else HourlyPricingStrategy()
+        self.ticketManager = ticketManager
+        self.parkingLot = parkingLot if parkingLot else ParkingLot.getInstance()
+
+    def exitVehicle(self, ticketId=None, plate=None, exitTime=None):
+        if ticketId is not None:
+            ticket = self.ticketManager.getTicket(ticketId)
+        else:
+            ticket = self.ticketManager.getActiveTicketByPlate(plate)
+        if ticket is None or not ticket.isActive():
+            print("No active ticket found")
+            return None
+        exitTime = exitTime if exitTime is not None else time.time()
+        fee = self.pricingStrategy.calculateFee(ticket, exitTime)
+        # only the gate that closes the ticket bills it and frees the spot
+        if not self.ticketManager.closeTicket(ticket, exitTime, fee):
+            print("No active ticket found")
+            return None
+        self.parkingLot.leaveSpot(ticket.spot)
+        return ticket
+
+
+class BookingReport:
+    def __init__(self, gateCount, bookings, rejections, doubleBookings, elapsed):
+        self.gateCount = gateCount
+        self.bookings = bookings
+        self.rejections = rejections
+        self.doubleBookings = doubleBookings
+        self.elapsed = elapsed
+        self.throughput = bookings / elapsed if elapsed > 0 else 0
+
+    def show(self):
+        print("Gates: ", self.gateCount, " Bookings: ", self.bookings, " Rejected: ", self.rejections,
+              " Double booked: ", self.doubleBookings, " Throughput (bookings/s): ", round(self.throughput))
+
+class BookingBenchmark:
+    '''
+    Books vehicles from many gates at once, one thread per gate, against the
+    shared lot, and checks that no spot was handed out twice.
+    '''
+    def __init__(self, gates):
+        self.gates = gates
+
+    def __runGate(self, gate, vehicles):
+        spots = []
+        rejections = 0
+        for vehicle in vehicles:
+            spot = gate.parkingLot.parkVehicle(vehicle, gate)
+            if spot:
+                spots.append(spot)
+            else:
+                rejections += 1
+        return spots, rejections
+
+    def run(self, vehiclesPerGate):
+        spots = []
+        rejections = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.gates)) as executor:
+            futures = [executor.submit(self.__runGate, gate, vehicles) for gate, vehicles in zip(self.gates, vehiclesPerGate)]
+            for future in futures:
+                gateSpots, gateRejections = future.result()
+                spots.extend(gateSpots)
+                rejections += gateRejections
+        elapsed = time.perf_counter() - start
+        doubleBookings = len(spots) - len(set(spot.spotId for spot in spots))
+        return BookingReport(len(self.gates), len(spots), rejections, doubleBookings, elapsed)
+
+
+class ArrivalProcess(ABC):
+    @abstractmethod
+    def nextArrival(self, now, rng):
+        pass
+
+class PoissonArrivals(ArrivalProcess):
+    def __init__(self, ratePerHour):
+        self.ratePerHour = ratePerHour
+
+    def nextArrival(self, now, rng):
+        return now + rng.expovariate(self.ratePerHour / 3600)
+
+class RushHourArrivals(ArrivalProcess):
+    '''
+    Poisson arrivals whose rate follows a daily profile: a base rate plus a
+    bell shaped peak around each rush hour. Drawn by thinning a Poisson
+    stream running at the profile's highest rate.
+    '''
+    def __init__(self, baseRatePerHour, peaks=((9, 1.0, 400), (18, 1.5, 300))):
+        self.baseRatePerHour = baseRatePerHour
+        self.peaks = peaks  # (hour of day, width in hours, extra arrivals per hour)
+        self.maxRatePerHour = baseRatePerHour + sum(extra for _, _, extra in peaks)
+
+    def rate(self, now):
+        hour = (now / 3600) % 24
+        return self.baseRatePerHour + sum(extra * math.exp(-0.5 * ((hour - center) / width) ** 2) for center, width, extra in self.peaks)
+
+    def nextArrival(self, now, rng):
+        while True:
+            now += rng.expovariate(self.maxRatePerHour / 3600)
+            if rng.random() * self.maxRatePerHour <= self.rate(now):
+                return now
+
+class SimulationReport:
+    def __init__(self, name, arrivals, latencies, rejectedLatencies, utilisation, peakUtilisation, totalDistance, events, elapsed):
+        # latencies of parked vehicles, rejectedLatencies of the ones turned away
+        self.name = name
+        self.arrivals = arrivals
+        self.parked = len(latencies)
+        self.rejections = len(rejectedLatencies)
+        self.utilisation = utilisation
+        self.peakUtilisation = peakUtilisation
+        self.meanDistance = totalDistance / self.parked if self.parked else 0
+        self.events = events
+        self.elapsed = elapsed
+        # every arrival asks for a spot, so rejections count towards the
+        # overall percentiles too; they are among the fastest, since a full
+        # floor is skipped on its free count without touching its heaps
+        allLatencies = sorted(latencies + rejectedLatencies)
+        self.p50Latency = self.__percentile(allLatencies, 50)
+        self.p99Latency = self.__percentile(allLatencies, 99)
+        self.p99RejectedLatency = self.__percentile(sorted(rejectedLatencies), 99)
+
+    @staticmethod
+    def __percentile(latencies, percent):
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, len(latencies) * percent // 100)]
+
+    def show(self):
+        print(self.name)
+        print("Events: ", self.events, " Events/s: ", round(self.events / self.elapsed) if self.elapsed > 0 else 0)
+        print("Arrivals: ", self.arrivals, " Parked: ", self.parked, " Rejected: ", self.rejections)
+        print("p50 allocation (us): ", round(self.p50Latency * 1e6, 1), " p99 allocation (us): ", round(self.p99Latency * 1e6, 1),
+              " p99 rejected allocation (us): ", round(self.p99RejectedLatency * 1e6, 1))
+        print("Utilisation: ", round(self.utilisation * 100, 1), "%  Peak: ", round(self.peakUtilisation * 100, 1), "%")
+        print("Mean distance from gate to spot: ", round(self.meanDistance, 1))
+
+class TrafficSimulator:
+    '''
+    Discrete event simulation of a lot: arrivals come from an ArrivalProcess
+    at a random gate, parked vehicles leave after an exponential dwell time.
+    Simulated time only drives the event order, while allocation latency is
+    the real time spent in parkVehicle. Utilisation is weighted by simulated
+    time.
+    '''
+    ARRIVAL = 0
+    DEPARTURE = 1
+
+    def __init__(self, parkingLot, gates, arrivalProcess, meanDwell=2 * 3600, vehicleMix=None, seed=0):
+        self.parkingLot = parkingLot
+        self.gates = gates
+        self.arrivalProcess = arrivalProcess
+        self.meanDwell = meanDwell
+        # vehicle class -> weight
+        self.vehicleMix = vehicleMix if vehicleMix else {TwoWheeler: 2, CompactCar: 2, FourWheeler: 4, LargeVehicle: 1, ElectricCar: 1, HandicapVehicle: 0.3}
+        self.seed = seed
+
+    def run(self, duration, name=""):
+        rng = random.Random(self.seed)
+        vehicleClasses = list(self.vehicleMix)
+        weights = list(self.vehicleMix.values())
+        totalSpots = self.parkingLot.getAvailableSpotCount() + self.parkingLot.getOccupiedSpotCount()
+        events = [(self.arrivalProcess.nextArrival(0, rng), 0, TrafficSimulator.ARRIVAL, None)]
+        sequence = itertools.count(1)
+        latencies = []
+        rejectedLatencies = []
+        arrivals = eventCount = 0
+        occupied = peakOccupied = 0
+        occupiedTime = 0
+        totalDistance = 0
+        lastTime = 0
+        start = time.perf_counter()
+        while events and events[0][0] < duration:
+            now, _, kind, spot = heapq.heappop(events)
+            eventCount += 1
+            occupiedTime += occupied * (now - lastTime)
+            lastTime = now
+            if kind == TrafficSimulator.ARRIVAL:
+                arrivals += 1
+                vehicle = rng.choices(vehicleClasses, weights)[0](arrivals)
+                gate = self.gates[rng.randrange(len(self.gates))]
+                allocationStart = time.perf_counter()
+                spot = self.parkingLot.parkVehicle(vehicle, gate)
+                latency = time.perf_counter() - allocationStart
+                if spot:
+                    latencies.append(latency)
+                    occupied += 1
+                    totalDistance += math.sqrt(NearestSpotParkingStrategy.distance(gate, spot))
+                    peakOccupied = max(peakOccupied, occupied)
+                    heapq.heappush(events, (now + rng.expovariate(1 / self.meanDwell), next(sequence), TrafficSimulator.DEPARTURE, spot))
+                else:
+                    rejectedLatencies.append(latency)
+                heapq.heappush(events, (self.arrivalProcess.nextArrival(now, rng), next(sequence), TrafficSimulator.ARRIVAL, None))
+            else:
+                self.parkingLot.leaveSpot(spot)
+                occupied -= 1
+        elapsed = time.perf_counter() - start
+        occupiedTime += occupied * (duration - lastTime)
+        utilisation = occupiedTime / (duration * totalSpots) if duration > 0 and totalSpots else 0
+        peakUtilisation = peakOccupied / totalSpots if totalSpots else 0
+        return SimulationReport(name, arrivals, latencies, rejectedLatencies, utilisation, peakUtilisation, totalDistance, eventCount, elapsed)
+
+def buildDemoLot(parkingStrategy=None, floors=4, spotsPerFloor=2500):
+    parkingLot = ParkingLot()
+    spotClasses = [TwoWheelerSpot, CompactSpot, FourWheelerSpot, FourWheelerSpot, FourWheelerSpot, LargeSpot, EVSpot, HandicapSpot]
+    for floorNumber in range(floors):
+        parkingLot.addFloor([spotClasses[i % len(spotClasses)](floorNumber * spotsPerFloor + i, i % 50, i // 50) for i in range(spotsPerFloor)], parkingStrategy)
+    return parkingLot
+
+def compareStrategies(strategyFactories, arrivalProcess, duration, gateCount=4, seed=0):
+    reports = []
+    for name, strategyFactory in strategyFactories:
+        parkingLot = buildDemoLot(strategyFactory())
+        gates = [EntranceGate(gate * 15, 0, parkingLot=parkingLot) for gate in range(gateCount)]
+        reports.append(TrafficSimulator(parkingLot, gates, arrivalProcess, seed=seed).run(duration, name))
+    return reports
+
+
+if __name__ == "__main__":
+    for gateCount in [1, 2, 4, 8]:
+        ParkingLot.reset()
+        parkingLot = ParkingLot.getInstance()
+        spotClasses = [TwoWheelerSpot, CompactSpot, FourWheelerSpot, FourWheelerSpot, LargeSpot, EVSpot, HandicapSpot]
+        for floorNumber in range(4):
+            parkingLot.addFloor([spotClasses[i % len(spotClasses)](floorNumber * 10000 + i, i % 100, i // 100) for i in range(10000)])
+        vehicleClasses = [TwoWheeler, CompactCar, FourWheeler, FourWheeler, LargeVehicle, ElectricCar, HandicapVehicle]
+        gates = [EntranceGate(gate * 10, 0) for gate in range(gateCount)]
+        vehiclesPerGate = [[vehicleClasses[i % len(vehicleClasses)](gate * 100000 + i) for i in range(32000 // gateCount)] for gate in range(gateCount)]
+        BookingBenchmark(gates).run(vehiclesPerGate).show()
+    print("=====================================")
+
+    strategies = [("Default", DefaultParkingStrategy), ("Nearest", NearestSpotParkingStrategy)]
+    for report in compareStrategies(strategies, RushHourArrivals(2000, ((9, 1.0, 6000), (18, 1.5, 4000))), 24 * 3600):
+        report.show()
@@ -1,6 +1,20 @@
 from enum import Enum
 from typing import List
+from decimal import Decimal, ROUND_HALF_UP
 from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, islice, repeat
+import asyncio
+import csv
+import heapq
+import json
+import mmap
+import struct
+import time
+from types import MappingProxyType
 
 class SplitType(Enum):
     EQUAL = 1
@@ -8,8 +22,87 @@ class SplitType(Enum):
     PERCENT = 3
     SHARE = 4
 
+MINOR_UNIT_DIGITS = 2
+DEFAULT_CURRENCY = "USD"
+MINOR_UNITS = 10 ** MINOR_UNIT_DIGITS
+
+def toMinorUnits(amount) -> int:
+    if isinstance(amount, (int, float)):
+        # amounts with at most MINOR_UNIT_DIGITS decimals are the common case
+        # and land within float noise of an integer, so skip Decimal for them
+        scaled = amount * MINOR_UNITS
+        rounded = round(scaled)
+        if abs(scaled - rounded) < 1e-6:
+            return int(rounded)
+    # goes through the decimal text of the amount so float noise never
+    # reaches the balances
+    return int((Decimal(str(amount)) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+def fromMinorUnits(amount: int) -> Decimal:
+    return Decimal(amount).scaleb(-MINOR_UNIT_DIGITS)
+
+class ExchangeRates:
+    '''
+    Local table of daily rates, each the number of base currency units one
+    unit of the currency buys. A day without a rate uses the latest earlier
+    one. Pair rates are memoized per (from, to, day) in a bounded LRU.
+    '''
+    def __init__(self, baseCurrency: str = DEFAULT_CURRENCY, cacheSize: int = 4096):
+        self.baseCurrency = baseCurrency
+        self.cacheSize = cacheSize
+        self.days: dict[str, List[int]] = {}  # currency -> sorted day ordinals
+        self.rates: dict[str, List[Decimal]] = {}  # currency -> rate on those days
+        self.cache = OrderedDict()
+
+    @staticmethod
+    def toDay(timestamp: float) -> int:
+        return datetime.fromtimestamp(timestamp, timezone.utc).date().toordinal()
+
+    def setRate(self, currency: str, day: date, rate):
+        days = self.days.setdefault(currency, [])
+        rates = self.rates.setdefault(currency, [])
+        ordinal = day.toordinal()
+        index = bisect_left(days, ordinal)
+        if index < len(days) and days[index] == ordinal:
+            rates[index] = Decimal(str(rate))
+        else:
+            days.insert(index, ordinal)
+            rates.insert(index, Decimal(str(rate)))
+        self.cache.clear()
+
+    def __baseRate(self, currency: str, day: int) -> Decimal:
+        if currency == self.baseCurrency:
+            return Decimal(1)
+        days = self.days.get(currency)
+        index = bisect_right(days, day) - 1 if days else -1
+        if index < 0:
+            raise KeyError("No " + currency + " rate on or before " + date.fromordinal(day).isoformat())
+        return self.rates[currency][index]
+
+    def getRate(self, fromCurrency: str, toCurrency: str, day: int) -> Decimal:
+        if fromCurrency == toCurrency:
+            return Decimal(1)
+        key = (fromCurrency, toCurrency, day)
+        rate = self.cache.get(key)
+        if rate is not None:
+            self.cache.move_to_end(key)
+            return rate
+        rate = self.__baseRate(fromCurrency, day) / self.__baseRate(toCurrency, day)
+        self.cache[key] = rate
+        if len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)
+        return rate
+
+    def convert(self, amountMinor: int, fromCurrency: str, toCurrency: str, timestamp: float) -> int:
+        if fromCurrency == toCurrency:
+            return amountMinor
+        rate = self.getRate(fromCurrency, toCurrency, self.toDay(timestamp))
+        return int((amountMinor * rate).to_integral_value(ROUND_HALF_UP))
+
+DEFAULT_EXCHANGE_RATES = ExchangeRates()
 
 class Balance:
+    # amounts are in minor units (cents) throughout the balances
     def __init__(self):
         self.amountOwed = 0
         self.amountGetBack = 0
@@ -34,6 +127,9 @@ class User:
         self.phone = phone
         self.userExpenseBalanceSheet: UserExpenseBalanceSheet = UserExpenseBalanceSheet()
 
+    def getId(self):
+        return self.id
+
     def getUserExpenseBalanceSheet(self):
         return self.userExpenseBalanceSheet
     
@@ -48,6 +144,9 @@ class UserExpenseBalanceSheet:
         self.totalYouOwe = 0
         self.totalYouGetBack = 0
 
+    def getUserBalance(self):
+        return self.userBalance
+
     def getTotalExpense(self):
         return self.totalExpense
     
@@ -73,83 +172,251 @@ class UserExpenseBalanceSheet:
         self.totalYouGetBack = amount
 
 class Split:
-    def __init__(self, user_id: int, amount: float):
-        self.user_id = user_id
+    __slots__ = ("user", "amount")
+
+    def __init__(self, user: User, amount: float):
+        self.user = user
         self.amount = amount
     
     def getUser(self):
-        return self.user_id
+        return self.user
 
     def getAmount(self):
         return self.amount
 
 
 class BalanceSheetManager:
-    def updateUserExpenseBalanceSheet(expensePaidBy: User, splits: List[Split], amount: int):
-        paidByUserExpenseBalanceSheet = expensePaidBy.getUserExpenseBalanceSheet()
-        paidByUserExpenseBalanceSheet.setTotalPayment(paidByUserExpenseBalanceSheet.getTotalPayment() + amount)
-
-        for split in splits:
-            userOwe = split.getUser()
-            userOweBalanceSheet = userOwe.getUserExpenseBalanceSheet()
-            oweAmount = split.getAmount()
-            if expensePaidBy == userOwe:
-                paidByUserExpenseBalanceSheet.setTotalExpense(paidByUserExpenseBalanceSheet.getTotalExpense() + oweAmount)
-            else:
-                paidByUserExpenseBalanceSheet.setTotalYouGetBack(paidByUserExpenseBalanceSheet.getTotalYouGetBack() + oweAmount)
-                
-                userOweBalance = None
-                if userOwe.getUser() in paidByUserExpenseBalanceSheet.userBalance:
-                    userOweBalance = paidByUserExpenseBalanceSheet.getUserBalance().get(userOwe.getUser())
-                else:
-                    userOweBalance = Balance()
-                    paidByUserExpenseBalanceSheet.getUserBalance().put(userOwe.getUser(), userOweBalance)
-                userOweBalance.setAmountOwed(userOweBalance.getAmountOwed() + oweAmount)
-
-                userOweBalanceSheet.setTotalYouOwe(userOweBalanceSheet.getTotalYouOwe() + oweAmount)
-                userOweBalanceSheet.setTotalYourExpense(userOweBalanceSheet.getTotalYourExpense() + oweAmount)
-
-                userPaidByBalance: Balance = None
-                if expensePaidBy.getUser() in userOweBalanceSheet.getUserBalance():
-                    userPaidByBalance = userOweBalanceSheet.getUserBalance().get(expensePaidBy.getUser())
-                else:
-                    userPaidByBalance = Balance()
-                    userOweBalanceSheet.getUserBalance().put(expensePaidBy.getUser(), userPaidByBalance)
-                userPaidByBalance.setAmountGetBack(userPaidByBalance.getAmountGetBack() + oweAmount)
+    @staticmethod
+    def updateUserExpenseBalanceSheet(expense: "Expense"):
+        BalanceSheetManager.updateUserExpenseBalanceSheets([expense])
+
+    @staticmethod
+    def updateUserExpenseBalanceSheets(expenses: List["Expense"]):
+        # sums the batch per user and per (payer, ower) pair first, so every
+        # sheet and pair balance is written once per batch
+        payments = {}
+        pairAmounts = {}
+        for expense in expenses:
+            paidBy = expense.paid_by
+            payments[paidBy] = payments.get(paidBy, 0) + expense.settledAmountMinor
+            for split, share in zip(expense.splits, expense.shares):
+                pair = (paidBy, split.getUser())
+                pairAmounts[pair] = pairAmounts.get(pair, 0) + share
+        BalanceSheetManager.applyTotals(payments, pairAmounts)
+
+    @staticmethod
+    def applyTotals(payments: dict, pairAmounts: dict):
+        # payments: payer -> amount paid, pairAmounts: (payer, ower) -> amount
+        # owed, where a payer's own share is a pair with themselves
+        ownExpenses = {paidBy: amount for (paidBy, userOwe), amount in pairAmounts.items() if paidBy == userOwe}
+
+        for user, amount in payments.items():
+            sheet = user.getUserExpenseBalanceSheet()
+            sheet.setTotalPayment(sheet.getTotalPayment() + amount)
+        for user, amount in ownExpenses.items():
+            sheet = user.getUserExpenseBalanceSheet()
+            sheet.setTotalExpense(sheet.getTotalExpense() + amount)
+        for (paidBy, userOwe), oweAmount in pairAmounts.items():
+            if paidBy == userOwe:
+                continue
+            paidBySheet = paidBy.getUserExpenseBalanceSheet()
+            userOweSheet = userOwe.getUserExpenseBalanceSheet()
+            paidBySheet.setTotalYouGetBack(paidBySheet.getTotalYouGetBack() + oweAmount)
+            userOweSheet.setTotalYouOwe(userOweSheet.getTotalYouOwe() + oweAmount)
+            userOweSheet.setTotalExpense(userOweSheet.getTotalExpense() + oweAmount)
 
+            userOweBalance = paidBySheet.getUserBalance().get(userOwe)
+            if userOweBalance is None:
+                userOweBalance = Balance()
+                paidBySheet.getUserBalance()[userOwe] = userOweBalance
+            userOweBalance.setAmountOwed(userOweBalance.getAmountOwed() + oweAmount)
+
+            userPaidByBalance = userOweSheet.getUserBalance().get(paidBy)
+            if userPaidByBalance is None:
+                userPaidByBalance = Balance()
+                userOweSheet.getUserBalance()[paidBy] = userPaidByBalance
+            userPaidByBalance.setAmountGetBack(userPaidByBalance.getAmountGetBack() + oweAmount)
+
+    @staticmethod
     def showUserExpenseBalanceSheet(user: User):
         print("--------------------------")                
         print("Balance sheet of user: ", user.getId())
         userExpenseBalanecSheet: UserExpenseBalanceSheet = user.getUserExpenseBalanceSheet()
 
-        print("Total Expense: ", userExpenseBalanecSheet.getTotalExpense())
-        print("Total Payment: ", userExpenseBalanecSheet.getTotalPayment())
-        print("Total You Owe: ", userExpenseBalanecSheet.getTotalYouOwe())
-        print("Total You Get Back: ", userExpenseBalanecSheet.getTotalYouGetBack())
+        print("Total Expense: ", fromMinorUnits(userExpenseBalanecSheet.getTotalExpense()))
+        print("Total Payment: ", fromMinorUnits(userExpenseBalanecSheet.getTotalPayment()))
+        print("Total You Owe: ", fromMinorUnits(userExpenseBalanecSheet.getTotalYouOwe()))
+        print("Total You Get Back: ", fromMinorUnits(userExpenseBalanecSheet.getTotalYouGetBack()))
 
         for user, balance in userExpenseBalanecSheet.getUserBalance().items():
             print("User: ", user.getId())
-            print("Amount Owed: ", balance.getAmountOwed())
-            print("Amount Get Back: ", balance.getAmountGetBack())
+            print("Amount Owed: ", fromMinorUnits(balance.getAmountOwed()))
+            print("Amount Get Back: ", fromMinorUnits(balance.getAmountGetBack()))
             print("--------------------------")
         
 
+class BalanceLedger:
+    '''
+    Net balance between every pair of users of a group, kept up to date one
+    split at a time. Each user's Balance holds the sum over their pairs, so it
+    is read in O(1) instead of being rebuilt from the expenses.
+    '''
+    def __init__(self):
+        self.pairBalances: dict[tuple, int] = {}  # (lower id, higher id) -> amount lower owes higher
+        self.userBalances: dict[int, Balance] = {}
+
+    def getBalance(self, userId: int) -> Balance:
+        balance = self.userBalances.get(userId)
+        if balance is None:
+            balance = Balance()
+            self.userBalances[userId] = balance
+        return balance
+
+    def getNetBalances(self) -> dict:
+        # positive when the user gets money back, negative when they owe
+        return {userId: balance.getAmountGetBack() - balance.getAmountOwed() for userId, balance in self.userBalances.items()}
+
+    def getPairBalance(self, debtorId: int, creditorId: int):
+        # how much debtor owes creditor, negative when it is the other way round
+        if debtorId < creditorId:
+            return self.pairBalances.get((debtorId, creditorId), 0)
+        return -self.pairBalances.get((creditorId, debtorId), 0)
+
+    def addDebt(self, debtorId: int, creditorId: int, amount: int):
+        if debtorId == creditorId:
+            return
+        if debtorId > creditorId:
+            debtorId, creditorId, amount = creditorId, debtorId, -amount
+        key = (debtorId, creditorId)
+        old = self.pairBalances.get(key, 0)
+        new = old + amount
+        if new == 0:
+            self.pairBalances.pop(key, None)
+        else:
+            self.pairBalances[key] = new
+
+        lower = self.getBalance(debtorId)
+        higher = self.getBalance(creditorId)
+        lowerOwesDelta = max(new, 0) - max(old, 0)
+        higherOwesDelta = max(-new, 0) - max(-old, 0)
+        lower.setAmountOwed(lower.getAmountOwed() + lowerOwesDelta)
+        higher.setAmountGetBack(higher.getAmountGetBack() + lowerOwesDelta)
+        higher.setAmountOwed(higher.getAmountOwed() + higherOwesDelta)
+        lower.setAmountGetBack(lower.getAmountGetBack() + higherOwesDelta)
+
+    def applyExpense(self, expense: "Expense"):
+        paidById = expense.paid_by.getId()
+        for split, share in zip(expense.splits, expense.shares):
+            self.addDebt(split.getUser().getId(), paidById, share)
+
+    def applyExpenses(self, expenses: List["Expense"]):
+        # a batch mostly hits the same few pairs, so their debts are summed first
+        pairDebts = {}
+        for expense in expenses:
+            paidById = expense.paid_by.getId()
+            for split, share in zip(expense.splits, expense.shares):
+                pair = (split.getUser().getId(), paidById)
+                pairDebts[pair] = pairDebts.get(pair, 0) + share
+        self.applyPairDebts(pairDebts)
+
+    def applyPairDebts(self, pairDebts: dict):
+        # (debtor id, creditor id) -> amount, the users' Balances are written
+        # once each at the end instead of once per pair
+        pairBalances = self.pairBalances
+        owed = {}
+        getBack = {}
+        for (debtorId, creditorId), amount in pairDebts.items():
+            if debtorId == creditorId or not amount:
+                continue
+            if debtorId > creditorId:
+                debtorId, creditorId, amount = creditorId, debtorId, -amount
+            key = (debtorId, creditorId)
+            old = pairBalances.get(key, 0)
+            new = old + amount
+            if new == 0:
+                del pairBalances[key]
+            else:
+                pairBalances[key] = new
+            # max(-x, 0) == max(x, 0) - x, so the higher user's delta follows
+            lowerOwesDelta = (new if new > 0 else 0) - (old if old > 0 else 0)
+            higherOwesDelta = lowerOwesDelta - amount
+            if lowerOwesDelta:
+                owed[debtorId] = owed.get(debtorId, 0) + lowerOwesDelta
+                getBack[creditorId] = getBack.get(creditorId, 0) + lowerOwesDelta
+            if higherOwesDelta:
+                owed[creditorId] = owed.get(creditorId, 0) + higherOwesDelta
+                getBack[debtorId] = getBack.get(debtorId, 0) + higherOwesDelta
+        for userId, amount in owed.items():
+            balance = self.getBalance(userId)
+            balance.setAmountOwed(balance.getAmountOwed() + amount)
+        for userId, amount in getBack.items():
+            balance = self.getBalance(userId)
+            balance.setAmountGetBack(balance.getAmountGetBack() + amount)
+
 class Expense:
-    def __init__(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split]):
+    __slots__ = ("id", "description", "amount", "amountMinor", "paid_by", "split_type", "splits", "shares", "timestamp", "currency", "settledAmountMinor")
+
+    def __init__(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split], timestamp: float = None, currency: str = None):
         self.id = id
         self.description = description
         self.amount = amount
+        self.amountMinor = toMinorUnits(amount)
         self.paid_by = paid_by
         self.split_type = split_type
         self.splits = splits
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.currency = currency  # None means the settlement currency of the group
+        # set once the expense is validated by a group, both in the group's
+        # settlement currency: the minor units owed by each split and their total
+        self.shares: List[int] = None
+        self.settledAmountMinor: int = None
+
+def distribute(total: int, weights: List[int]) -> List[int]:
+    '''
+    Splits total minor units in proportion to integer weights. The units lost
+    to flooring go to the largest remainders, ties to the earlier participant,
+    so the shares always add up to total and the same input gives the same
+    shares.
+    '''
+    weightSum = sum(weights)
+    scaled = [total * weight for weight in weights]
+    shares = [value // weightSum for value in scaled]
+    leftover = total - sum(shares)
+    if leftover:
+        remainders = [value % weightSum for value in scaled]
+        for index in sorted(range(len(weights)), key=remainders.__getitem__, reverse=True)[:leftover]:
+            shares[index] += 1
+    return shares
 
 class ExpenseSplit(ABC):
+    def computeShares(self, expense: Expense) -> List[int]:
+        '''
+        Returns the minor units owed by each split, None when the expense is
+        not valid for this kind of split
+        '''
+        return self.computeSharesOf(expense.amountMinor, [split.amount for split in expense.splits])
+
     @abstractmethod
-    def validate(self, expense: Expense):
+    def computeSharesOf(self, amountMinor: int, amounts: List[float]) -> List[int]:
+        # the same from the amount and the split amounts, without the objects
         pass
 
+    def validate(self, expense: Expense):
+        return self.computeShares(expense) is not None
+
 class SplitFactory:
+    # the splits hold no state, so one instance of each is shared
+    splits = {}
+
     def get_split(self, split_type: SplitType):
+        split = SplitFactory.splits.get(split_type)
+        if split is None:
+            split = SplitFactory.create_split(split_type)
+            SplitFactory.splits[split_type] = split
+        return split
+
+    @staticmethod
+    def create_split(split_type: SplitType):
         if split_type == SplitType.EQUAL:
             return EqualSplit()
         elif split_type == SplitType.EXACT:
@@ -161,86 +428,566 @@ class SplitFactory:
 
 
 class EqualSplit(ExpenseSplit):
-    def validate(self, expense: Expense):
-        total_amount = 0
-        for split in expense.splits:
-            total_amount += split.amount
-
-        if total_amount != expense.amount:
-            return False
+    def computeShares(self, expense: Expense):
+        return self.computeSharesOf(expense.amountMinor, expense.splits)
 
-        return True
+    def computeSharesOf(self, amountMinor: int, amounts: List[float]):
+        # the amounts on the splits are ignored, everyone pays the same
+        count = len(amounts)
+        if count == 0:
+            return None
+        share, remainder = divmod(amountMinor, count)
+        return [share + 1] * remainder + [share] * (count - remainder)
 
 class ExactSplit(ExpenseSplit):
-    def validate(self, expense: Expense):
-        total_amount = 0
-        for split in expense.splits:
-            total_amount += split.amount
+    def computeSharesOf(self, amountMinor: int, amounts: List[float]):
+        shares = [toMinorUnits(amount) for amount in amounts]
+        if not shares or sum(shares) != amountMinor:
+            return None
+        return shares
 
-        if total_amount != expense.amount:
-            return False
+class PercentSplit(ExpenseSplit):
+    def computeSharesOf(self, amountMinor: int, amounts: List[float]):
+        # percentages in hundredths so 33.33 stays exact
+        weights = [toMinorUnits(amount) for amount in amounts]
+        if not weights or sum(weights) != 100 * 100 or min(weights) < 0:
+            return None
+        return distribute(amountMinor, weights)
 
-        return True
+class ShareSplit(ExpenseSplit):
+    def computeSharesOf(self, amountMinor: int, amounts: List[float]):
+        weights = [toMinorUnits(amount) for amount in amounts]
+        if not weights or min(weights) < 0 or sum(weights) == 0:
+            return None
+        return distribute(amountMinor, weights)
 
-class PercentSplit(ExpenseSplit):
-    def validate(self, expense: Expense):
-        total_percent = 0
-        for split in expense.splits:
-            total_percent += split.amount
+class ExpenseBatch:
+    '''
+    Validated expenses kept as plain tuples, so a bulk import reaches the
+    store and the balances without an Expense and its Splits per row. The
+    splits of all rows are flattened into splitUsers and splitShares, with
+    splitCounts splits per row. Amounts are in minor units, the settled
+    amount and the shares in the settlement currency.
+    '''
+    __slots__ = ("rows", "splitCounts", "splitUsers", "splitShares")
 
-        if total_percent != 100:
-            return False
+    def __init__(self):
+        self.rows = []
+        self.splitCounts = []
+        self.splitUsers: List[User] = []
+        self.splitShares: List[int] = []
 
-        return True
+    def __len__(self):
+        return len(self.rows)
 
-class ShareSplit(ExpenseSplit):
-    def validate(self, expense: Expense):
-        return True
+    def add(self, id: int, description: str, amountMinor: int, settledAmountMinor: int, payer: User, splitType: SplitType, timestamp: float, currency: str, users: List[User], shares: List[int]):
+        self.rows.append((id, description, amountMinor, settledAmountMinor, payer, splitType.value, timestamp, currency))
+        self.splitCounts.append(len(users))
+        self.splitUsers += users
+        self.splitShares += shares
+
+    def columns(self):
+        # ids, descriptions, amounts, settled amounts, payers, split types,
+        # timestamps and currencies, one tuple each
+        return tuple(zip(*self.rows)) if self.rows else ((),) * 8
+
+class ExpenseStore:
+    '''
+    Column store for the expenses of a group. Every expense is one row in
+    parallel arrays, and its splits are a slice [splitOffsets[row],
+    splitOffsets[row + 1]) of the split columns (CSR layout). Users are
+    stored as ordinals into a small user table. Expense objects are only built
+    when a row is read. Row numbers and offsets are unsigned 32 bit, so a store
+    holds up to 2**32 - 1 splits and description bytes.
+
+    save writes the columns to a file, and load maps that file back in without
+    copying it.
+    '''
+    MAGIC = b"SPLITWS2"
+    COLUMNS = (
+        ("ids", "q"),
+        ("payers", "i"),
+        ("amounts", "q"),
+        ("timestamps", "d"),
+        ("splitTypes", "b"),
+        ("currencies", "I"),
+        ("splitOffsets", "I"),
+        ("descriptionOffsets", "I"),
+        ("splitUsers", "i"),
+        ("splitShares", "q"),
+        ("userIds", "q"),
+    )
 
-class ExpenseManager:
     def __init__(self):
-        self.expenses = []
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode))
+        self.splitOffsets.append(0)
+        self.descriptionOffsets.append(0)
+        self.descriptions = bytearray()
+        self.users: List[User] = []
+        self.userOrdinals: dict[int, int] = {}
+        self.userRows: List[array] = []  # ordinal -> rows the user paid or took part in
+        self.ordered = True  # rows are in timestamp order
+        self.mapping = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield self.get(row)
+
+    def __getitem__(self, row: int) -> Expense:
+        return self.get(row)
+
+    def __ordinal(self, user: User) -> int:
+        ordinal = self.userOrdinals.get(user.getId())
+        if ordinal is None:
+            ordinal = len(self.users)
+            self.users.append(user)
+            self.userOrdinals[user.getId()] = ordinal
+            self.userIds.append(user.getId())
+            self.userRows.append(array("I"))
+        return ordinal
+
+    def append(self, expense: Expense):
+        if self.mapping is not None:
+            self.__detach()
+        row = len(self.ids)
+        if row and expense.timestamp < self.timestamps[-1]:
+            self.ordered = False
+        payer = self.__ordinal(expense.paid_by)
+        self.ids.append(expense.id)
+        self.payers.append(payer)
+        self.amounts.append(expense.amountMinor)
+        self.timestamps.append(expense.timestamp)
+        self.splitTypes.append(expense.split_type.value)
+        self.currencies.append(int.from_bytes(expense.currency.encode(), "big"))  # ISO codes fit in 32 bits
+        self.descriptions += expense.description.encode()
+        self.descriptionOffsets.append(len(self.descriptions))
+
+        self.userRows[payer].append(row)
+        for split, share in zip(expense.splits, expense.shares):
+            ordinal = self.__ordinal(split.getUser())
+            self.splitUsers.append(ordinal)
+            self.splitShares.append(share)
+            rows = self.userRows[ordinal]
+            if not rows or rows[-1] != row:
+                rows.append(row)
+        self.splitOffsets.append(len(self.splitUsers))
+
+    def extend(self, expenses: List[Expense]):
+        for expense in expenses:
+            self.append(expense)
+
+    def extendBatch(self, batch: ExpenseBatch):
+        # one extend per column instead of an append per row and split
+        if self.mapping is not None:
+            self.__detach()
+        if not len(batch):
+            return
+        start = len(self.ids)
+        ids, descriptions, amounts, _, payers, splitTypes, timestamps, currencies = batch.columns()
+        if self.ordered and ((start and timestamps[0] < self.timestamps[-1]) or any(earlier > later for earlier, later in zip(timestamps, timestamps[1:]))):
+            self.ordered = False
+        users = set(payers).union(batch.splitUsers)
+        if any(user.getId() not in self.userOrdinals for user in users):
+            # new users get the ordinals append would have given them
+            splitUsers = iter(batch.splitUsers)
+            for payer, count in zip(payers, batch.splitCounts):
+                self.__ordinal(payer)
+                for user in islice(splitUsers, count):
+                    self.__ordinal(user)
+        ordinals = {user: self.userOrdinals[user.getId()] for user in users}
+        payers = list(map(ordinals.__getitem__, payers))
+        splitUsers = list(map(ordinals.__getitem__, batch.splitUsers))
+        codes = {currency: int.from_bytes(currency.encode(), "big") for currency in set(currencies)}
+        descriptions = [description.encode() for description in descriptions]
+
+        self.ids.extend(ids)
+        self.payers.extend(payers)
+        self.amounts.extend(amounts)
+        self.timestamps.extend(timestamps)
+        self.splitTypes.extend(splitTypes)
+        self.currencies.extend(map(codes.__getitem__, currencies))
+        self.descriptionOffsets.extend(islice(accumulate(map(len, descriptions), initial=len(self.descriptions)), 1, None))
+        self.descriptions += b"".join(descriptions)
+        self.splitOffsets.extend(islice(accumulate(batch.splitCounts, initial=len(self.splitUsers)), 1, None))
+        self.splitUsers.extend(splitUsers)
+        self.splitShares.extend(batch.splitShares)
+
+        # rows per user, in order and once per row even when the user both
+        # paid and took part
+        rows = range(start, start + len(batch))
+        userRows = [[] for _ in self.users]
+        for ordinal, row in zip(payers, rows):
+            userRows[ordinal].append(row)
+        for ordinal, row in zip(splitUsers, chain.from_iterable(map(repeat, rows, batch.splitCounts))):
+            userRows[ordinal].append(row)
+        for ordinal, added in enumerate(userRows):
+            if added:
+                self.userRows[ordinal].extend(sorted(set(added)))
+
+    def get(self, row: int) -> Expense:
+        users = self.users
+        start, end = self.splitOffsets[row], self.splitOffsets[row + 1]
+        shares = list(self.splitShares[start:end])
+        splits = [Split(users[ordinal], fromMinorUnits(share)) for ordinal, share in zip(self.splitUsers[start:end], shares)]  # settlement currency
+        description = bytes(self.descriptions[self.descriptionOffsets[row]:self.descriptionOffsets[row + 1]]).decode()
+        expense = Expense(self.ids[row], description, fromMinorUnits(self.amounts[row]), users[self.payers[row]], SplitType(self.splitTypes[row]), splits, self.timestamps[row], self.getCurrency(row))
+        expense.shares = shares
+        expense.settledAmountMinor = sum(shares)
+        return expense
+
+    def getCurrency(self, row: int) -> str:
+        code = self.currencies[row]
+        return code.to_bytes((code.bit_length() + 7) // 8, "big").decode()
+
+    def getExpensesForUser(self, user: User) -> List[Expense]:
+        ordinal = self.userOrdinals.get(user.getId())
+        if ordinal is None:
+            return []
+        return [self.get(row) for row in self.userRows[ordinal]]
+
+    def getOrdinal(self, user: User) -> int:
+        return self.userOrdinals.get(user.getId())
+
+    def getSplits(self, row: int):
+        # (user ordinal, share) pairs of a row without building objects
+        start, end = self.splitOffsets[row], self.splitOffsets[row + 1]
+        return zip(self.splitUsers[start:end], self.splitShares[start:end])
+
+    def countUntil(self, timestamp: float) -> int:
+        # number of rows with a timestamp <= the given one, rows must be ordered
+        return bisect_right(self.timestamps, timestamp)
+
+    def getRowsBetween(self, start: float, end: float) -> List[int]:
+        # rows with start <= timestamp < end
+        if self.ordered:
+            return list(range(bisect_left(self.timestamps, start), bisect_left(self.timestamps, end)))
+        return [row for row, timestamp in enumerate(self.timestamps) if start <= timestamp < end]
+
+    def getExpensesBetween(self, start: float, end: float) -> List[Expense]:
+        return [self.get(row) for row in self.getRowsBetween(start, end)]
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(self.MAGIC)
+            for name, typecode in self.COLUMNS:
+                self.__writeBlock(file, getattr(self, name))
+            self.__writeBlock(file, self.descriptions)
+
+    @staticmethod
+    def __writeBlock(file, data):
+        data = memoryview(data).cast("B")
+        file.write(struct.pack("<q", len(data)))
+        file.write(data)
+        file.write(bytes(-len(data) % 8))  # keeps every block 8 byte aligned
+
+    @classmethod
+    def load(cls, path: str, users: dict) -> "ExpenseStore":
+        '''
+        Maps a saved store back in. users maps user id to User. The columns
+        stay views over the file until the next append copies them into arrays.
+        '''
+        store = cls()
+        with open(path, "rb") as file:
+            store.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(store.mapping)
+        if bytes(view[:len(cls.MAGIC)]) != cls.MAGIC:
+            raise ValueError("Not an expense store: " + path)
+        offset = len(cls.MAGIC)
+        for name, typecode in cls.COLUMNS + (("descriptions", "B"),):
+            size = struct.unpack_from("<q", view, offset)[0]
+            offset += 8
+            setattr(store, name, view[offset:offset + size].cast(typecode))
+            offset += size + (-size % 8)
+
+        store.users = [users[userId] for userId in store.userIds]
+        store.userOrdinals = {userId: ordinal for ordinal, userId in enumerate(store.userIds)}
+        store.userRows = [array("I") for _ in store.users]
+        for row in range(len(store.ids)):
+            store.userRows[store.payers[row]].append(row)
+            for ordinal in store.splitUsers[store.splitOffsets[row]:store.splitOffsets[row + 1]]:
+                rows = store.userRows[ordinal]
+                if not rows or rows[-1] != row:
+                    rows.append(row)
+        timestamps = store.timestamps
+        store.ordered = all(timestamps[row] <= timestamps[row + 1] for row in range(len(timestamps) - 1))
+        return store
 
-    def add_expense(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split]) -> Expense:
-        split_factory = SplitFactory()
-        split = split_factory.get_split(split_type)
-        if not split.validate(Expense(id, description, amount, paid_by, split_type, splits)):
+    def __detach(self):
+        # the mapped columns are read only, copy them before the first write
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode, getattr(self, name)))
+        self.descriptions = bytearray(self.descriptions)
+        self.mapping = None
+
+class BalanceHistory:
+    '''
+    Answers "what was the balance at time T" for a group. Every
+    checkpointInterval expenses it keeps a copy of the ledger's balances. A
+    query starts from the last checkpoint before T and replays only the rows
+    of the user asked about, which the store indexes by user, so it costs
+    O(log n + k) with k bounded by that user's rows since the checkpoint.
+    '''
+    def __init__(self, store: ExpenseStore, ledger: BalanceLedger, checkpointInterval: int = 1000):
+        self.store = store
+        self.ledger = ledger
+        self.checkpointInterval = checkpointInterval
+        self.checkpointRows = [0]
+        self.checkpoints = [({}, {})]  # (pair balances, net balances) as of checkpointRows
+
+    def rowsUntilCheckpoint(self, rows: int):
+        return max(self.checkpointRows[-1] + self.checkpointInterval - rows, 1)
+
+    def onExpensesAdded(self, rows: int = None):
+        # rows is how many of the store's rows the ledger has applied so far
+        rows = len(self.store) if rows is None else rows
+        if rows - self.checkpointRows[-1] >= self.checkpointInterval:
+            self.checkpointRows.append(rows)
+            self.checkpoints.append((dict(self.ledger.pairBalances), self.ledger.getNetBalances()))
+
+    def __start(self, timestamp: float):
+        # rows before the end all happened by timestamp, the checkpoint
+        # is the last one taken at or before that row
+        if self.store.ordered:
+            end = self.store.countUntil(timestamp)
+            index = bisect_right(self.checkpointRows, end) - 1
+            return self.checkpointRows[index], end, self.checkpoints[index]
+        # out of order rows cannot use the checkpoints, replay everything
+        return 0, len(self.store), self.checkpoints[0]
+
+    def __rowsOf(self, ordinal: int, start: int, end: int):
+        rows = self.store.userRows[ordinal]
+        return rows[bisect_left(rows, start):bisect_left(rows, end)]
+
+    def getPairBalanceAt(self, debtor: User, creditor: User, timestamp: float):
+        '''
+        How much debtor owed creditor right after timestamp, negative when it
+        was the other way round
+        '''
+        start, end, (pairBalances, _) = self.__start(timestamp)
+        debtorId, creditorId = debtor.getId(), creditor.getId()
+        if debtorId < creditorId:
+            balance = pairBalances.get((debtorId, creditorId), 0)
+        else:
+            balance = -pairBalances.get((creditorId, debtorId), 0)
+
+        store = self.store
+        debtorOrdinal, creditorOrdinal = store.getOrdinal(debtor), store.getOrdinal(creditor)
+        if debtorOrdinal is None or creditorOrdinal is None:
+            return balance
+        for row in self.__rowsOf(debtorOrdinal, start, end):
+            if not store.ordered and store.timestamps[row] > timestamp:
+                continue
+            payer = store.payers[row]
+            if payer not in (debtorOrdinal, creditorOrdinal):
+                continue
+            for ordinal, share in store.getSplits(row):
+                if payer == creditorOrdinal and ordinal == debtorOrdinal:
+                    balance += share
+                elif payer == debtorOrdinal and ordinal == creditorOrdinal:
+                    balance -= share
+        return balance
+
+    def getNetBalanceAt(self, user: User, timestamp: float):
+        # positive when the user was owed money overall
+        start, end, (_, netBalances) = self.__start(timestamp)
+        balance = netBalances.get(user.getId(), 0)
+        store = self.store
+        ordinal = store.getOrdinal(user)
+        if ordinal is None:
+            return balance
+        for row in self.__rowsOf(ordinal, start, end):
+            if not store.ordered and store.timestamps[row] > timestamp:
+                continue
+            payer = store.payers[row]
+            for splitOrdinal, share in store.getSplits(row):
+                if payer == ordinal and splitOrdinal != ordinal:
+                    balance += share
+                elif splitOrdinal == ordinal and payer != ordinal:
+                    balance -= share
+        return balance
+
+    def getActivity(self, user: User, before: int = None, limit: int = 20):
+        '''
+        A page of the user's expenses, newest first. Pass the returned cursor
+        as before to get the next page, it is None once there are no more.
+        '''
+        ordinal = self.store.getOrdinal(user)
+        if ordinal is None:
+            return [], None
+        rows = self.store.userRows[ordinal]
+        end = len(rows) if before is None else bisect_left(rows, before)
+        page = rows[max(end - limit, 0):end][::-1]
+        cursor = page[-1] if len(page) == limit and end > limit else None
+        return [self.store.get(row) for row in page], cursor
+
+class ExpenseManager:
+    def __init__(self, currency: str = DEFAULT_CURRENCY, exchange_rates: ExchangeRates = None):
+        self.currency = currency
+        self.exchange_rates = exchange_rates if exchange_rates is not None else DEFAULT_EXCHANGE_RATES
+        self.expenses = ExpenseStore()
+        self.balance_ledger = BalanceLedger()
+        self.balance_history = BalanceHistory(self.expenses, self.balance_ledger)
+        self.split_factory = SplitFactory()
+
+    def validate(self, expense: Expense) -> bool:
+        shares = self.split_factory.get_split(expense.split_type).computeShares(expense)
+        if shares is None:
+            return False
+        if expense.currency is None:
+            expense.currency = self.currency
+        settled = self.settle(expense.amountMinor, shares, expense.currency, expense.timestamp)
+        if settled is None:
+            return False
+        expense.settledAmountMinor, expense.shares = settled
+        return True
+
+    def settle(self, amountMinor: int, shares: List[int], currency: str, timestamp: float):
+        # (amount, shares) in the settlement currency, None without a rate
+        if currency == self.currency:
+            return amountMinor, shares
+        # converted once when the expense is posted, the total is converted
+        # and spread back over the splits so they still add up exactly
+        try:
+            settledAmountMinor = self.exchange_rates.convert(amountMinor, currency, self.currency, timestamp)
+        except KeyError:
+            return None
+        return settledAmountMinor, distribute(settledAmountMinor, shares) if amountMinor else shares
+
+    def revalue(self, currency: str) -> dict:
+        '''
+        Net balance of every user with the whole history converted to another
+        currency at each expense's own date. One pass over the store columns
+        with the rates memoized per currency and day.
+        '''
+        store = self.expenses
+        rates = self.exchange_rates
+        balances = {}
+        for row in range(len(store)):
+            settled = store.splitShares[store.splitOffsets[row]:store.splitOffsets[row + 1]]
+            settledTotal = sum(settled)
+            if settledTotal == 0:
+                continue
+            total = rates.convert(store.amounts[row], store.getCurrency(row), currency, store.timestamps[row])
+            payerId = store.users[store.payers[row]].getId()
+            for (ordinal, _), share in zip(store.getSplits(row), distribute(total, list(settled))):
+                userId = store.users[ordinal].getId()
+                if userId != payerId:
+                    balances[payerId] = balances.get(payerId, 0) + share
+                    balances[userId] = balances.get(userId, 0) - share
+        return balances
+
+    def add_expense(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split], currency: str = None) -> Expense:
+        expense = Expense(id, description, amount, paid_by, split_type, splits, currency=currency)
+        if not self.validate(expense):
             print("Invalid expense")
             return None
-        expense = Expense(id, description, amount, paid_by, split_type, splits)
-        self.expenses.append(expense)
+        self.add_expenses([expense])
         return expense
 
-    def get_balance_for_user(self, user: User):
-        pass
+    def add_expenses(self, expenses: List[Expense]):
+        # expects validated expenses
+        self.expenses.extend(expenses)
+        # the ledger takes the batch in chunks that end on checkpoint
+        # boundaries, so a large batch still gets a checkpoint at each one
+        rows = len(self.expenses) - len(expenses)
+        start = 0
+        while start < len(expenses):
+            end = min(start + self.balance_history.rowsUntilCheckpoint(rows + start), len(expenses))
+            self.balance_ledger.applyExpenses(expenses[start:end])
+            self.balance_history.onExpensesAdded(rows + end)
+            start = end
+        BalanceSheetManager.updateUserExpenseBalanceSheets(expenses)
+
+    def add_batch(self, batch: "ExpenseBatch"):
+        # add_expenses for rows in column form, expects validated rows
+        self.expenses.extendBatch(batch)
+        _, _, _, settledAmounts, payers, _, _, _ = batch.columns()
+        users = {user.getId(): user for user in set(payers).union(batch.splitUsers)}
+        userIds = {user: userId for userId, user in users.items()}
+        offsets = list(accumulate(batch.splitCounts, initial=0))
+        splitUserIds = list(map(userIds.__getitem__, batch.splitUsers))
+        splitPayerIds = list(chain.from_iterable(map(repeat, map(userIds.__getitem__, payers), batch.splitCounts)))
+        pairDebts = {}  # (ower id, payer id) -> amount over the whole batch
+        rows = len(self.expenses) - len(batch)
+        start = 0
+        while start < len(batch):
+            end = min(start + self.balance_history.rowsUntilCheckpoint(rows + start), len(batch))
+            chunkDebts = {}
+            splitStart, splitEnd = offsets[start], offsets[end]
+            for pair, share in zip(zip(splitUserIds[splitStart:splitEnd], splitPayerIds[splitStart:splitEnd]), batch.splitShares[splitStart:splitEnd]):
+                chunkDebts[pair] = chunkDebts.get(pair, 0) + share
+            self.balance_ledger.applyPairDebts(chunkDebts)
+            self.balance_history.onExpensesAdded(rows + end)
+            for pair, amount in chunkDebts.items():
+                pairDebts[pair] = pairDebts.get(pair, 0) + amount
+            start = end
+        payments = {}
+        for paidBy, amount in zip(payers, settledAmounts):
+            payments[paidBy] = payments.get(paidBy, 0) + amount
+        BalanceSheetManager.applyTotals(payments, {(users[payerId], users[owerId]): amount for (owerId, payerId), amount in pairDebts.items()})
+
+    def get_expenses_for_user(self, user: User) -> List[Expense]:
+        return self.expenses.getExpensesForUser(user)
+
+    def get_balance_between_at(self, debtor: User, creditor: User, timestamp: float):
+        return self.balance_history.getPairBalanceAt(debtor, creditor, timestamp)
+
+    def get_activity(self, user: User, before: int = None, limit: int = 20):
+        return self.balance_history.getActivity(user, before, limit)
+
+    def get_balance_for_user(self, user: User) -> Balance:
+        return self.balance_ledger.getBalance(user.getId())
+
+    def get_balance_between(self, debtor: User, creditor: User):
+        return self.balance_ledger.getPairBalance(debtor.getId(), creditor.getId())
 
     def show(self):
         pass
 
 class UserManager:
     def __init__(self):
-        self.users = []
+        self.users: dict[int, User] = {}
+        self.users_by_email: dict[str, User] = {}
+        self.users_by_phone: dict[int, User] = {}
 
-    def add_user(self, id: int, name: str, email: str, phone: int):
-        user = User(id, name, email, phone, {})
-        self.users.append(user)
+    def add_user(self, id: int, name: str, email: str, phone: int) -> User:
+        if id in self.users or email in self.users_by_email or phone in self.users_by_phone:
+            print("User already exists")
+            return None
+        user = User(id, name, email, phone)
+        self.users[id] = user
+        self.users_by_email[email] = user
+        self.users_by_phone[phone] = user
+        return user
 
     def get_user(self, id: int):
-        for user in self.users:
-            if user.id == id:
-                return user
+        return self.users.get(id)
+
+    def get_user_by_email(self, email: str):
+        return self.users_by_email.get(email)
+
+    def get_user_by_phone(self, phone: int):
+        return self.users_by_phone.get(phone)
 
     def show(self):
-        for user in self.users:
+        for user in self.users.values():
             print(user.id, user.name, user.email, user.phone)
 
 class Group:
-    def __init__(self, id: int, name: str, users: List[User], expenses: List[Expense]):
+    def __init__(self, id: int, name: str, users: List[User], expenses: List[Expense], currency: str = DEFAULT_CURRENCY, exchange_rates: ExchangeRates = None):
         self.id = id
         self.name = name
         self.users = users  
-        self.expenses = expenses
-        self.expense_manager = ExpenseManager()
+        self.currency = currency  # settlement currency
+        self.expense_manager = ExpenseManager(currency, exchange_rates)
+        self.expenses = self.expense_manager.expenses  # one store shared with the expense manager
+        self.settlements = None
+        if expenses:
+            self.addExpenses([expense for expense in expenses if self.expense_manager.validate(expense)])
 
     def addMember(self, user: User):
         self.users.append(user)
@@ -254,11 +1001,27 @@ class Group:
     def setGroupName(self, name):
         self.name = name
     
-    def createExpense(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split]) -> Expense:
-        expense = self.expense_manager.add_expense(id, description, amount, paid_by, split_type, splits)
-        self.expenses.append(expense)
+    def createExpense(self, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split], currency: str = None) -> Expense:
+        expense = self.expense_manager.add_expense(id, description, amount, paid_by, split_type, splits, currency)
+        if expense is not None:
+            self.settlements = None
         return expense
 
+    def addExpenses(self, expenses: List[Expense]):
+        self.expense_manager.add_expenses(expenses)
+        self.settlements = None
+
+    def addBatch(self, batch: ExpenseBatch):
+        self.expense_manager.add_batch(batch)
+        self.settlements = None
+
+    def simplifyDebts(self) -> List["Settlement"]:
+        # net balances are kept incrementally by the ledger, so only the
+        # matching is redone and only when an expense arrived since last time
+        if self.settlements is None:
+            self.settlements = DebtSimplifier.simplify(self.expense_manager.balance_ledger.getNetBalances(), {user.getId(): user for user in self.users})
+        return self.settlements
+
     def show(self):
         print("Group Name: ", self.name)
         print("Group Members: ")
@@ -268,37 +1031,360 @@ class Group:
         for expense in self.expenses:
             print(expense.id, expense.description, expense.amount, expense.paid_by.name, expense.split_type)
             for split in expense.splits:
-                print(split.user_id.name, split.amount)
+                print(split.user.name, split.amount)
 
-class GroupManager:
+class Settlement:
+    def __init__(self, payer: User, receiver: User, amount: int):
+        self.payer = payer
+        self.receiver = receiver
+        self.amount = amount
+
+    def show(self):
+        print(self.payer.name, "pays", self.receiver.name, fromMinorUnits(self.amount))
+
+class DebtSimplifier:
+    '''
+    Turns the net balances of a group into a short list of settlements.
+    Groups up to EXACT_LIMIT members with a balance get the minimum number of
+    transfers, bigger ones fall back to matching the largest debtor with the
+    largest creditor through two heaps.
+    '''
+    EXACT_LIMIT = 12
+
+    @staticmethod
+    def simplify(netBalances: dict, users: dict) -> List[Settlement]:
+        balances = [(userId, amount) for userId, amount in netBalances.items() if amount != 0]
+        if len(balances) <= DebtSimplifier.EXACT_LIMIT:
+            transfers = DebtSimplifier.exact(balances)
+        else:
+            transfers = DebtSimplifier.greedy(balances)
+        return [Settlement(users[payerId], users[receiverId], amount) for payerId, receiverId, amount in transfers]
+
+    @staticmethod
+    def greedy(balances: list) -> list:
+        creditors = [(-amount, userId) for userId, amount in balances if amount > 0]
+        debtors = [(amount, userId) for userId, amount in balances if amount < 0]
+        heapq.heapify(creditors)
+        heapq.heapify(debtors)
+
+        transfers = []
+        while creditors and debtors:
+            credit, creditorId = heapq.heappop(creditors)
+            debt, debtorId = heapq.heappop(debtors)
+            amount = min(-credit, -debt)
+            transfers.append((debtorId, creditorId, amount))
+            if -credit > amount:
+                heapq.heappush(creditors, (credit + amount, creditorId))
+            if -debt > amount:
+                heapq.heappush(debtors, (debt + amount, debtorId))
+        return transfers
+
+    @staticmethod
+    def exact(balances: list) -> list:
+        # n balances settle in n - k transfers where k is the largest number of
+        # disjoint zero sum subsets, found with a dp over subsets
+        n = len(balances)
+        if n == 0:
+            return []
+        full = (1 << n) - 1
+        total = [0] * (full + 1)
+        groups = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            lowest = (mask & -mask).bit_length() - 1
+            total[mask] = total[mask & (mask - 1)] + balances[lowest][1]
+            best = 0
+            for i in range(n):
+                if mask >> i & 1 and groups[mask ^ (1 << i)] > best:
+                    best = groups[mask ^ (1 << i)]
+            groups[mask] = best + (1 if total[mask] == 0 else 0)
+
+        # peel the zero sum subsets back off the full set, each one settles
+        # on its own in size - 1 transfers
+        transfers = []
+        mask = full
+        current = []
+        while mask:
+            isZero = total[mask] == 0
+            for i in range(n):
+                if mask >> i & 1 and groups[mask ^ (1 << i)] == groups[mask] - (1 if isZero else 0):
+                    if isZero and current:
+                        transfers.extend(DebtSimplifier.greedy(current))
+                        current = []
+                    current.append(balances[i])
+                    mask ^= 1 << i
+                    break
+        transfers.extend(DebtSimplifier.greedy(current))
+        return transfers
+
+def simplify_debts(group: Group) -> List[Settlement]:
+    return group.simplifyDebts()
+
+class ImportReport:
     def __init__(self):
-        self.groups = []
+        self.imported = 0
+        self.rejected = []  # (line number, reason)
+
+    def show(self):
+        print("Imported: ", self.imported)
+        print("Rejected: ", len(self.rejected))
+        for lineNumber, reason in self.rejected:
+            print(lineNumber, reason)
+
+class ExpenseImporter:
+    '''
+    Streams expenses into a group from CSV or JSON lines, validating each row
+    and applying the accepted ones to the balances batchSize at a time.
+
+    CSV columns: id, description, amount, paid_by, split_type, splits and an
+    optional timestamp and currency, where splits reads
+    "userId:amount;userId:amount". A JSON line carries the same keys with
+    splits as a list of [userId, amount] pairs.
+    '''
+    def __init__(self, group: Group, batchSize: int = 10000):
+        self.group = group
+        self.batchSize = batchSize
+        self.users = {user.getId(): user for user in group.users}
+        self.expense_manager = group.expense_manager
+        self.currency = self.expense_manager.currency
+        self.splitTypes = {splitType.name: (splitType, self.expense_manager.split_factory.get_split(splitType)) for splitType in SplitType}
+
+    def importCsv(self, file) -> ImportReport:
+        rows = csv.reader(file)
+        next(rows, None)  # header
+        return self.importRows(rows, self.__decodeCsv)
+
+    def importJsonLines(self, file) -> ImportReport:
+        return self.importRows(file, self.__decodeJsonLine)
+
+    # the decoders run inside importRows' try, so a short or broken line is
+    # reported as a rejected row instead of aborting the import
+
+    @staticmethod
+    def __decodeCsv(row):
+        if not row:
+            return None
+        return row[0], row[1], row[2], row[3], row[4], [split.split(":") for split in row[5].split(";") if split], row[6] if len(row) > 6 and row[6] else None, row[7] if len(row) > 7 and row[7] else None
+
+    @staticmethod
+    def __decodeJsonLine(line):
+        if not line.strip():
+            return None
+        record = json.loads(line)
+        return record["id"], record["description"], record["amount"], record["paid_by"], record["split_type"], record["splits"], record.get("timestamp"), record.get("currency")
+
+    def __parse(self, row, batch: ExpenseBatch) -> bool:
+        # adds the row to batch, False when it does not validate
+        id, description, amount, paidBy, splitType, splits, timestamp, currency = row
+        users = self.users
+        splitType, split = self.splitTypes[splitType]
+        amountMinor = toMinorUnits(float(amount))
+        payer = users[int(paidBy)]
+        splitUsers = [users[int(userId)] for userId, _ in splits]
+        shares = split.computeSharesOf(amountMinor, [float(splitAmount) for _, splitAmount in splits])
+        if shares is None:
+            return False
+        timestamp = float(timestamp) if timestamp is not None else time.time()
+        settledAmountMinor = amountMinor
+        if currency is None:
+            currency = self.currency
+        elif currency != self.currency:
+            settled = self.expense_manager.settle(amountMinor, shares, currency, timestamp)
+            if settled is None:
+                return False
+            settledAmountMinor, shares = settled
+        batch.add(int(id), description, amountMinor, settledAmountMinor, payer, splitType, timestamp, currency, splitUsers, shares)
+        return True
+
+    def importRows(self, rows, decode=None) -> ImportReport:
+        '''
+        rows are (id, description, amount, paid_by, split_type, splits,
+        timestamp, currency) tuples, or raw rows that decode turns into them.
+        decode returns None for rows to skip, such as blank lines.
+        '''
+        report = ImportReport()
+        batch = ExpenseBatch()
+        for lineNumber, row in enumerate(rows, 1):
+            try:
+                if decode is not None:
+                    row = decode(row)
+                    if row is None:
+                        continue
+                valid = self.__parse(row, batch)
+            except (KeyError, ValueError, TypeError, IndexError, AttributeError) as error:
+                report.rejected.append((lineNumber, "Malformed row: " + repr(error)))
+                continue
+            if not valid:
+                report.rejected.append((lineNumber, "Invalid expense"))
+                continue
+            if len(batch) >= self.batchSize:
+                self.group.addBatch(batch)
+                report.imported += len(batch)
+                batch = ExpenseBatch()
+        if len(batch):
+            self.group.addBatch(batch)
+            report.imported += len(batch)
+        return report
+
+class GroupManager:
+    def __init__(self, exchange_rates: ExchangeRates = None):
+        self.exchange_rates = exchange_rates
+        self.groups: dict[int, Group] = {}
+        self.user_groups: dict[int, dict[int, Group]] = {}  # user id -> groups they belong to
 
-    def createGroup(self, id: int, name: str, users: List[User]):
-        group = Group(id, name, users, [])
-        self.groups.append(group)
+    def createGroup(self, id: int, name: str, users: List[User], currency: str = DEFAULT_CURRENCY) -> Group:
+        if id in self.groups:
+            print("Group already exists")
+            return None
+        group = Group(id, name, list(users), [], currency, self.exchange_rates)
+        self.groups[id] = group
+        for user in users:
+            self.user_groups.setdefault(user.getId(), {})[id] = group
+        return group
+
+    def addMember(self, id: int, user: User):
+        group = self.groups[id]
+        group.addMember(user)
+        self.user_groups.setdefault(user.getId(), {})[id] = group
     
     def getGroup(self, id: int):
-        for group in self.groups:
-            if group.id == id:
-                return group
+        return self.groups.get(id)
+
+    def getGroupsForUser(self, user: User) -> List[Group]:
+        return list(self.user_groups.get(user.getId(), {}).values())
 
     def show(self):
-        for group in self.groups:
+        for group in self.groups.values():
             group.show()
 
 class Splitwise:
-    def __init__(self):
+    def __init__(self, exchange_rates: ExchangeRates = None):
+        self.exchange_rates = exchange_rates if exchange_rates is not None else DEFAULT_EXCHANGE_RATES
         self.user_manager = UserManager()
-        self.group_manager = GroupManager()
+        self.group_manager = GroupManager(self.exchange_rates)
 
     def show(self):
         self.user_manager.show()
         self.group_manager.show()
     
-    def createUser(self, id: int, name: str, email: str, phone: int):
-        self.user_manager.add_user(id, name, email, phone)
+    def createUser(self, id: int, name: str, email: str, phone: int) -> User:
+        return self.user_manager.add_user(id, name, email, phone)
+
+    def login(self, email: str) -> User:
+        return self.user_manager.get_user_by_email(email)
     
-    def createGroup(self, id: int, name: str, users: List[User]):
-        self.group_manager.createGroup(id, name, users)
+    def createGroup(self, id: int, name: str, users: List[User], currency: str = DEFAULT_CURRENCY) -> Group:
+        return self.group_manager.createGroup(id, name, users, currency)
+
+    def addMember(self, groupId: int, user: User):
+        self.group_manager.addMember(groupId, user)
+
+    def getGroupsForUser(self, user: User) -> List[Group]:
+        return self.group_manager.getGroupsForUser(user)
+
+
+class GroupSnapshot:
+    '''
+    Read only view of a group's balances at one point. A new one replaces it
+    after every batch, so readers never need a lock.
+    '''
+    __slots__ = ("version", "expenseCount", "netBalances", "pairBalances")
+
+    def __init__(self, version: int, expenseCount: int, netBalances: dict, pairBalances: dict):
+        self.version = version
+        self.expenseCount = expenseCount
+        self.netBalances = MappingProxyType(netBalances)
+        self.pairBalances = MappingProxyType(pairBalances)
+
+    @classmethod
+    def ofGroup(cls, group: Group, version: int = 0) -> "GroupSnapshot":
+        ledger = group.expense_manager.balance_ledger
+        return cls(version, len(group.expenses), ledger.getNetBalances(), dict(ledger.pairBalances))
+
+class GroupActor:
+    '''
+    Owns the writes of one group. Posted expenses go through a queue, and the
+    actor applies whatever has piled up as a single batch, so writers of
+    the same group are serialised without a lock and the balances are
+    updated once per batch.
+    '''
+    def __init__(self, group: Group, maxBatch: int = 1000):
+        self.group = group
+        self.maxBatch = maxBatch
+        self.queue = asyncio.Queue()
+        self.snapshot = GroupSnapshot.ofGroup(group)
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            request = await self.queue.get()
+            if request is None:
+                return
+            batch = [request]
+            while len(batch) < self.maxBatch and not self.queue.empty():
+                request = self.queue.get_nowait()
+                if request is None:
+                    self.apply(batch)
+                    return
+                batch.append(request)
+            self.apply(batch)
+
+    def apply(self, batch):
+        expense_manager = self.group.expense_manager
+        try:
+            accepted = [expense for expense, _ in batch if expense_manager.validate(expense)]
+            self.group.addExpenses(accepted)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        self.snapshot = GroupSnapshot.ofGroup(self.group, self.snapshot.version + 1)
+        for expense, future in batch:
+            if not future.done():
+                future.set_result(expense if expense.shares is not None else None)
+
+    async def post(self, expense: Expense) -> Expense:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((expense, future))
+        return await future
+
+    async def close(self):
+        self.queue.put_nowait(None)
+        await self.task
+
+class SplitwiseService:
+    '''
+    Async front of the Splitwise facade. Each group gets its own actor for
+    writes, while reads return the group's latest snapshot. All actors run on
+    one event loop, so the per-user balance sheets, which span groups, are
+    only ever touched by one batch at a time.
+    '''
+    def __init__(self, splitwise: Splitwise, maxBatch: int = 1000):
+        self.splitwise = splitwise
+        self.maxBatch = maxBatch
+        self.actors: dict[int, GroupActor] = {}
+
+    def __actor(self, groupId: int) -> GroupActor:
+        actor = self.actors.get(groupId)
+        if actor is None:
+            group = self.splitwise.group_manager.getGroup(groupId)
+            if group is None:
+                raise KeyError("Unknown group: " + str(groupId))
+            actor = GroupActor(group, self.maxBatch)
+            self.actors[groupId] = actor
+        return actor
+
+    async def postExpense(self, groupId: int, id: int, description: str, amount: float, paid_by: User, split_type: SplitType, splits: List[Split], currency: str = None) -> Expense:
+        # None when the expense does not validate
+        return await self.__actor(groupId).post(Expense(id, description, amount, paid_by, split_type, splits, currency=currency))
+
+    def getSnapshot(self, groupId: int) -> GroupSnapshot:
+        actor = self.actors.get(groupId)
+        if actor is not None:
+            return actor.snapshot
+        return GroupSnapshot.ofGroup(self.splitwise.group_manager.getGroup(groupId))
 
+    async def close(self):
+        for actor in self.actors.values():
+            await actor.close()